@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from wagtail.rich_text import RichText
+from wagtail.rich_text.rewriters import LinkRewriter
+
+from base.cache import bump_generation, get_generation, get_templates_version
+from base.navigation import get_tree_version
+from base.rich_text import preloaded_links
+
+MEDIA_GENERATION = 'media'
+BODY_CACHE_TIMEOUT = 60 * 60 * 24
+# Part of the body cache key. Increase it when a change to the block
+# classes alters their markup; template changes are picked up by
+# get_templates_version.
+BODY_CACHE_VERSION = 1
+
+
+def has_h2_block(body):
+    """
+    Check if a StreamField body contains an h2 block.
+    """
+    for block in body:
+        if block.block_type == 'h2':
+            return True
+    return False
+
+
+def prefetch_body(body):
+    """
+    Load everything the blocks of a body refer to before rendering it.
+
+    Chooser blocks already load their pages, documents and images with
+    one query per type for the whole body. This adds the renditions of
+    the images, and collects the pages and documents linked from rich
+    text, so they can be loaded together rather than one paragraph at
+    a time.
+
+    Args:
+        body (obj): StreamValue.
+
+    Returns:
+        A dictionary of rich text link types mapped to sets of ids, for
+        base.rich_text.preloaded_links.
+    """
+    links = defaultdict(set)
+    images = []
+    link_rewriter = LinkRewriter()
+    for block in body:
+        if isinstance(block.value, RichText):
+            for link_type, tags in link_rewriter.extract_tags(block.value.source).items():
+                links[link_type].update(
+                    tag.attrs['id'] for tag in tags if 'id' in tag.attrs
+                )
+        elif block.block_type == 'image_link' and block.value['link_image']:
+            images.append(block.value['link_image'])
+
+    prefetch_related_objects(images, 'renditions')
+    return links
+
+
+def _render(page):
+    with preloaded_links(prefetch_body(page.body)):
+        html = render_to_string('base/includes/body_blocks.html', {'page': page})
+    return {'html': html, 'has_h2': has_h2_block(page.body)}
+
+
+def render_body(page, request=None):
+    """
+    Render the blocks of a page's body.
+
+    The result is cached against the page's live revision, and until
+    the page tree or any image or document changes, since blocks link
+    to pages and documents and show image renditions. It is also
+    keyed on the block templates and BODY_CACHE_VERSION, so a deploy
+    never serves bodies rendered by older code. Previews are never
+    cached.
+
+    Args:
+        page (obj): page with a body StreamField.
+        request (obj or None): request object.
+
+    Returns:
+        A dictionary with the rendered blocks as html, and has_h2, True
+        when the body has its own h2 heading.
+    """
+    if getattr(request, 'is_preview', False):
+        body = _render(page)
+    else:
+        key = (
+            f'body:{BODY_CACHE_VERSION}:{get_templates_version()}:'
+            f'{page.pk}:{page.live_revision_id}:'
+            f'{get_tree_version()}:{get_generation(MEDIA_GENERATION)}'
+        )
+        body = cache.get(key)
+        if body is None:
+            body = _render(page)
+            cache.set(key, body, BODY_CACHE_TIMEOUT)
+
+    return {'html': mark_safe(body['html']), 'has_h2': body['has_h2']}
+
+
+def invalidate_bodies():
+    bump_generation(MEDIA_GENERATION)
@@ -0,0 +1,138 @@
+import functools
+import hashlib
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template import engines
+
+GENERATION_CACHE_KEY = 'research_data:generation:%s'
+
+
+def get_generation(name):
+    """
+    Return the current value of a named generation counter.
+
+    Generation counters are stored in the default cache so that every
+    process sees the same value. They start from a timestamp rather
+    than zero, so that a cache restart never hands out a value that
+    was already used for something that has since gone stale.
+
+    Args:
+        name (str): name of the counter, e.g. 'page-tree'.
+
+    Returns:
+        int
+    """
+    key = GENERATION_CACHE_KEY % name
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name):
+    """
+    Move a named generation counter on, invalidating everything that
+    was cached against its previous value.
+
+    The counter is moved on straight away and once more when the current
+    transaction commits, so that no other process can cache data read
+    before the commit against the new value.
+
+    Args:
+        name (str): name of the counter, e.g. 'page-tree'.
+
+    Returns:
+        int, the new generation.
+    """
+    transaction.on_commit(lambda: increment_generation(name))
+    return increment_generation(name)
+
+
+def increment_generation(name):
+    """
+    Move a named generation counter on by exactly one, right away.
+
+    Args:
+        name (str): name of the counter.
+
+    Returns:
+        int, the new generation.
+    """
+    key = GENERATION_CACHE_KEY % name
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = time.time_ns()
+        cache.set(key, generation, None)
+        return generation
+
+
+@functools.cache
+def get_templates_version():
+    """
+    Return a short hash of the project's own template files, worked out
+    once per process.
+
+    Rendered markup that is cached for a long time includes it in its
+    cache key, so that a deploy which changes a template never serves
+    markup rendered with the old one.
+
+    Returns:
+        str
+    """
+    base_dir = Path(settings.BASE_DIR).resolve()
+    template_dirs = {
+        Path(directory).resolve()
+        for engine in engines.all()
+        for directory in engine.template_dirs
+    }
+    digest = hashlib.sha256()
+    for directory in sorted(template_dirs):
+        if not directory.is_relative_to(base_dir):
+            continue
+        for path in sorted(directory.rglob('*')):
+            if path.is_file():
+                digest.update(str(path.relative_to(base_dir)).encode())
+                digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+class ProcessCache:
+    """
+    Process-local dictionary that empties itself whenever one of the
+    generation counters it depends on moves on.
+
+    Reading it costs one cache lookup per generation and never touches
+    the database.
+    """
+
+    def __init__(self, *generations):
+        self.generations = generations
+        self._data = {}
+        self._seen = None
+
+    def _current_data(self):
+        seen = tuple(get_generation(name) for name in self.generations)
+        if seen != self._seen:
+            # Swap in a new dictionary rather than clearing the old one, so
+            # concurrent readers never see a half emptied cache.
+            self._data = {}
+            self._seen = seen
+        return self._data
+
+    def get_or_set(self, key, default):
+        """
+        Return the value stored under key, calling default() to compute
+        and store it on a miss.
+        """
+        data = self._current_data()
+        try:
+            return data[key]
+        except KeyError:
+            value = data[key] = default()
+            return value
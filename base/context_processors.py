@@ -0,0 +1,12 @@
+from wagtail.contrib.settings.context_processors import SettingProxy
+
+from base.settings_cache import prime_request
+
+
+def settings(request):
+    """
+    Same as Wagtail's settings context processor, but served from the
+    process-wide settings cache.
+    """
+    prime_request(request)
+    return {'settings': SettingProxy(request_or_site=request)}
@@ -0,0 +1,247 @@
+from datetime import datetime
+from functools import reduce
+from html import unescape
+from operator import or_
+from urllib.parse import urlencode
+
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber, Substr
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from wagtail.models import Page
+from wagtail.rich_text import RichText
+
+# Length of excerpts taken from the body, in characters.
+EXCERPT_LENGTH = 300
+
+
+def load_children(parents, count, queryset=None, order_by=('path',)):
+    """
+    Load the first live, in-menu children of several parent pages with
+    a single query, numbering each parent's children with a window
+    function so the database returns at most count of them per parent.
+
+    Children have their StreamFields deferred.
+
+    Args:
+        parents (list): parent pages.
+        count (int): maximum number of children per parent.
+        queryset (obj or None): queryset of the children to consider,
+            e.g. of a specific page type. Defaults to specific pages of
+            any type.
+        order_by (tuple): ordering of each parent's children.
+
+    Returns:
+        A dictionary mapping parent page ids to lists of children.
+    """
+    children = {parent.pk: [] for parent in parents}
+    if not parents or count < 1:
+        return children
+    if queryset is None:
+        queryset = Page.objects.specific()
+
+    parent_paths = {parent.path: parent.pk for parent in parents}
+    child_pages = (
+        queryset.live()
+        .in_menu()
+        .filter(
+            reduce(
+                or_,
+                [
+                    Q(path__startswith=parent.path, depth=parent.depth + 1)
+                    for parent in parents
+                ],
+            )
+        )
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=Substr('path', 1, (F('depth') - 1) * Page.steplen),
+                order_by=list(order_by),
+            )
+        )
+        .filter(position__lte=count)
+        .order_by(*order_by)
+        .defer_streamfields()
+    )
+    for child in child_pages:
+        children[parent_paths[child.path[: -Page.steplen]]].append(child)
+    return children
+
+
+def make_listing_excerpt(excerpt, body):
+    """
+    Work out the excerpt for listing cards: the page's own excerpt if
+    it has one, otherwise the first 300 characters of text of its first
+    block, with any tags cut off closed again.
+
+    Args:
+        excerpt (str): the page's own excerpt as rich text, may be empty.
+        body (obj): the page's body StreamField value.
+
+    Returns:
+        A tuple of the excerpt as rich text, in the database format so
+        links are expanded when rendered with the richtext filter, and
+        as plain text.
+    """
+    source = excerpt or ''
+    if not source and body:
+        value = body[0].value
+        if isinstance(value, RichText):
+            source = Truncator(value.source).chars(EXCERPT_LENGTH, html=True)
+        elif isinstance(value, str):
+            source = Truncator(value).chars(EXCERPT_LENGTH, html=True)
+    text = ' '.join(unescape(strip_tags(source)).split())
+    return source, Truncator(text).chars(EXCERPT_LENGTH)
+
+
+def populate_listing_excerpts(model, batch_size=500):
+    """
+    Work out and store the listing excerpts of every page of a model
+    without sending any signals. Works with the historical models of
+    data migrations, which have none of the page methods.
+
+    Args:
+        model (class): a page model with listing excerpt fields.
+        batch_size (int): number of pages to update at a time.
+    """
+    fields = ['listing_excerpt', 'listing_excerpt_text']
+    pages = []
+    for page in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+        page.listing_excerpt, page.listing_excerpt_text = make_listing_excerpt(
+            getattr(page, 'excerpt', ''), page.body
+        )
+        pages.append(page)
+        if len(pages) >= batch_size:
+            model.objects.bulk_update(pages, fields)
+            pages = []
+    model.objects.bulk_update(pages, fields)
+
+
+class KeysetPaginator:
+    """
+    Counterpart of Django's Paginator for keyset pages, which only
+    needs the number of items rather than counting them itself.
+    """
+
+    def __init__(self, count, per_page):
+        self.count = count
+        self.per_page = per_page
+        self.num_pages = max(1, -(-count // per_page))
+
+
+class KeysetPage:
+    """
+    One page of a listing ordered newest first on a date field and the
+    primary key, with the same interface as a Django paginator page.
+
+    Links to the neighbouring pages carry the date and primary key of
+    the items at either end, so fetching them never needs an OFFSET.
+    """
+
+    def __init__(self, object_list, number, paginator, field):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.field = field
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return bool(self.object_list) and self.number < self.paginator.num_pages
+
+    def has_previous(self):
+        return bool(self.object_list) and self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def _page_query(self, number, direction, item):
+        params = {'page': number}
+        if getattr(item, self.field) is not None:
+            params[direction] = encode_cursor(getattr(item, self.field), item.pk)
+        return '?' + urlencode(params)
+
+    def next_page_query(self):
+        return self._page_query(self.number + 1, 'after', self.object_list[-1])
+
+    def previous_page_query(self):
+        return self._page_query(self.number - 1, 'before', self.object_list[0])
+
+
+def encode_cursor(value, pk):
+    return f'{value.isoformat()}_{pk}'
+
+
+def decode_cursor(cursor):
+    """
+    Return the date and primary key in a cursor, or None when it is not
+    a valid one.
+    """
+    try:
+        value, pk = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def paginate_by_keyset(queryset, request, per_page, count, field):
+    """
+    Paginate a queryset newest first on a date field and the primary
+    key, without counting or skipping rows in the database.
+
+    Pages reached through the links of another page use the after or
+    before cursor in the query string. A bare ?page=N falls back to an
+    offset, except for the last page, which is read from the other end.
+
+    Args:
+        queryset (obj): queryset to paginate, without ordering.
+        request (obj): request object.
+        per_page (int): items per page.
+        count (int): total number of items, e.g. from a cache.
+        field (str): name of the date field, e.g. 'first_published_at'.
+
+    Returns:
+        A KeysetPage.
+    """
+    paginator = KeysetPaginator(count, per_page)
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        number = 1
+    number = min(max(number, 1), paginator.num_pages)
+
+    newest_first = queryset.order_by(f'-{field}', '-pk')
+    oldest_first = queryset.order_by(field, 'pk')
+
+    after = decode_cursor(request.GET.get('after'))
+    before = decode_cursor(request.GET.get('before'))
+    if after is not None:
+        value, pk = after
+        items = list(
+            newest_first.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            )[:per_page]
+        )
+    elif before is not None:
+        value, pk = before
+        items = list(
+            oldest_first.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+            )[:per_page]
+        )[::-1]
+    elif number > 1 and number == paginator.num_pages:
+        last_page_size = count - (number - 1) * per_page
+        items = list(oldest_first[:last_page_size])[::-1]
+    else:
+        start = (number - 1) * per_page
+        items = list(newest_first[start : start + per_page])
+
+    return KeysetPage(items, number, paginator, field)
@@ -0,0 +1,46 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from base.models import AbstractBasePage
+
+
+class Command(BaseCommand):
+    help = (
+        'Works out the stored listing excerpts of every page again, e.g. '
+        'after loading fixtures or changing how excerpts are made'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of pages to update at a time.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in apps.get_models():
+            if not issubclass(model, AbstractBasePage):
+                continue
+
+            pages = []
+            updated = 0
+            for page in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+                excerpt = page.get_listing_excerpt()
+                if excerpt != (page.listing_excerpt, page.listing_excerpt_text):
+                    page.listing_excerpt, page.listing_excerpt_text = excerpt
+                    pages.append(page)
+                if len(pages) >= batch_size:
+                    updated += self.update(model, pages)
+                    pages = []
+            updated += self.update(model, pages)
+
+            self.stdout.write(f'Updated {updated} {model._meta.verbose_name_plural}.')
+
+    def update(self, model, pages):
+        # bulk_update sends no signals, so this leaves caches and the
+        # search index alone.
+        return model.objects.bulk_update(
+            pages, ['listing_excerpt', 'listing_excerpt_text']
+        )
@@ -0,0 +1,16 @@
+from base.sites import find_site_for_request
+
+
+class SiteMiddleware:
+    """
+    Resolve the current site from the process-wide site map before the
+    request reaches Wagtail, so that page serving, settings and
+    template tags all share a single lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        find_site_for_request(request)
+        return self.get_response(request)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_alter_interactivediagram_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='standardpage',
+            name='listing_excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='standardpage',
+            name='listing_excerpt_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -1,4 +1,10 @@
+import hashlib
+from collections import defaultdict
+
+from django.core.cache import cache
 from django.db import models
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from wagtail.admin.panels import FieldPanel, HelpPanel, MultiFieldPanel, PageChooserPanel
 from wagtail.blocks import (
     CharBlock,
@@ -16,6 +22,9 @@ from wagtail.images.blocks import ImageChooserBlock
 from wagtail.models import Page
 from wagtail.search import index
 
+from base.cache import get_templates_version
+from base.listings import load_children, make_listing_excerpt
+
 
 class LinkFields(models.Model):
     """
@@ -131,17 +140,17 @@ class FloatingButton(LinkFields):
 
 @register_setting(icon='image')
 class MainLogo(BaseGenericSetting, Logo):
-    pass
+    select_related = ['image', 'link_page', 'link_document']
 
 
 @register_setting(icon='image')
 class FooterLogo(BaseGenericSetting, Logo):
-    pass
+    select_related = ['image', 'link_page', 'link_document']
 
 
 @register_setting(icon='comment')
 class FloatingFooterButton(BaseGenericSetting, FloatingButton):
-    pass
+    select_related = ['link_page', 'link_document']
 
 
 @register_setting(icon='rotate')
@@ -394,6 +403,42 @@ class InteractiveDiagram(BaseGenericSetting):
         ),
     ]
 
+    svg_template = 'base/includes/interactive_diagram_svg.html'
+
+    def get_svg_cache_key(self):
+        """
+        Cache key for the rendered diagram. It is derived from the field
+        values and the project's templates, so every saved version of the
+        setting, and every deploy that changes the diagram template, gets
+        its own key.
+        """
+        values = [
+            str(field.value_from_object(self)) for field in self._meta.concrete_fields
+        ]
+        digest = hashlib.sha256('\x1f'.join(values).encode()).hexdigest()[:16]
+        return (
+            f'interactive-diagram:{self.svg_template}:'
+            f'{get_templates_version()}:{digest}'
+        )
+
+    def render_svg(self):
+        """
+        Render the diagram markup and store it in the cache.
+        """
+        svg = render_to_string(self.svg_template, {'diagram': self})
+        cache.set(self.get_svg_cache_key(), svg, None)
+        return svg
+
+    def get_svg(self):
+        """
+        Return the rendered diagram markup, rendering it only if this
+        version of the setting has not been rendered yet.
+        """
+        svg = cache.get(self.get_svg_cache_key())
+        if svg is None:
+            svg = self.render_svg()
+        return mark_safe(svg)
+
     class Meta:
         verbose_name = "Interactive Diagram Settings"
         verbose_name_plural = "Interactive Diagram Settings"
@@ -447,6 +492,67 @@ class SectionBlock(StructBlock):
     class Meta:
         template = 'base/blocks/section_block.html'
 
+    def get_context(self, value, parent_context=None):
+        """
+        Add the child pages to show as section_pages, taking them from
+        the prepared_sections of the parent context when the page has
+        prepared every section at once (see prepare_sections).
+        """
+        context = super().get_context(value, parent_context=parent_context)
+
+        page = value['page']
+        if page is None:
+            context['section_pages'] = []
+            return context
+
+        key = (page.pk, value['count'])
+        prepared_sections = (parent_context or {}).get('prepared_sections')
+        if prepared_sections is None or key not in prepared_sections:
+            prepared_sections = prepare_sections([value])
+
+        context['section_pages'] = prepared_sections[key]
+        return context
+
+
+def prepare_sections(sections):
+    """
+    Load the child pages of several SectionBlocks in one pass.
+
+    Page types can provide their own section pages with a
+    get_section_children(parents, count) class method, as news index
+    pages do for their latest stories. The children of all other
+    sections come from a single query, limited per parent page in the
+    database. StreamFields are deferred, as cards use the stored
+    listing excerpt.
+
+    Args:
+        sections (iterable): SectionBlock values.
+
+    Returns:
+        A dictionary mapping (page id, count) to lists of specific pages.
+    """
+    sections = [value for value in sections if value['page'] is not None]
+    count = max([value['count'] for value in sections], default=0)
+
+    parents_by_class = defaultdict(dict)
+    for value in sections:
+        parents_by_class[value['page'].specific_class][value['page'].pk] = value['page']
+
+    children = {}
+    listing_parents = []
+    for page_class, parents in parents_by_class.items():
+        get_section_children = getattr(page_class, 'get_section_children', None)
+        if get_section_children is None:
+            listing_parents.extend(parents.values())
+        else:
+            children.update(get_section_children(list(parents.values()), count))
+    children.update(load_children(listing_parents, count))
+
+    return {
+        (value['page'].pk, value['count']): children[value['page'].pk][: value['count']]
+        for value in sections
+    }
+
 
 class AbstractBasePage(Page):
     class Meta:
@@ -466,6 +572,11 @@ class AbstractBasePage(Page):
         help_text="Number of levels deep to show child pages (1 means immediate children only).",
     )
 
+    # Excerpt shown on listing cards, worked out on save so that
+    # listings never need the body. See get_listing_excerpt.
+    listing_excerpt = models.TextField(blank=True, editable=False)
+    listing_excerpt_text = models.TextField(blank=True, editable=False)
+
     content_panels = Page.content_panels + [FieldPanel('body')]
 
     show_in_menus_default = True
@@ -474,6 +585,19 @@ class AbstractBasePage(Page):
         index.SearchField('body'),
     ]
 
+    def get_listing_excerpt(self):
+        """
+        Work out the excerpt for listing cards, see make_listing_excerpt.
+        """
+        return make_listing_excerpt(getattr(self, 'excerpt', ''), self.body)
+
+    def save(self, *args, **kwargs):
+        # Saves of a few fields, e.g. when saving a revision, leave the
+        # live content alone.
+        if kwargs.get('update_fields') is None:
+            self.listing_excerpt, self.listing_excerpt_text = self.get_listing_excerpt()
+        return super().save(*args, **kwargs)
+
 
 class StandardPage(AbstractBasePage):
     # Needs to stay here, unfortunately
@@ -514,7 +638,7 @@ class StandardPage(AbstractBasePage):
         Override the page object's get context method.
         """
         # Needs to stay here, unfortunately
-        from services.models import ServicePage
+        from services.models import ServicePage, prepare_service_cards
 
         context = super(StandardPage, self).get_context(request)
 
@@ -522,8 +646,9 @@ class StandardPage(AbstractBasePage):
         if self.associated_research_lifecycle_phase:
             slug = self.associated_research_lifecycle_phase.slug
             filter_param = 'research_lifecycle_phase_additions__phase__slug'
-            services = (
-                ServicePage.objects.live().filter(**{filter_param: slug}).distinct()
+            services = prepare_service_cards(
+                ServicePage.objects.live().filter(**{filter_param: slug}).distinct(),
+                request,
             )
 
         context['services'] = services
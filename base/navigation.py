@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from wagtail.models import Page
+
+from base.cache import bump_generation, get_generation
+
+TREE_GENERATION = 'page-tree'
+NAVIGATION_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class NavigationNode:
+    """
+    Lightweight, in-memory representation of a page in a
+    nested navigation menu.
+    """
+
+    __slots__ = ('title', 'url', 'depth', 'children', 'has_children')
+
+    def __init__(self, title, url, depth):
+        self.title = title
+        self.url = url
+        self.depth = depth
+        self.children = []
+        self.has_children = False
+
+
+def get_nested_pages(page, max_depth=1, request=None):
+    """
+    Load the live, in-menu descendants of a page with a single
+    materialized-path query and build the nested structure in memory.
+
+    One extra level below max_depth is loaded so that the deepest
+    rendered items know whether they have children of their own.
+
+    Args:
+        page (obj): the page whose descendants should be listed.
+        max_depth (int): number of levels to include.
+        request (obj or None): request object, used for URL generation.
+
+    Returns:
+        A list of NavigationNode objects for the immediate children
+        of page.
+    """
+    if max_depth < 1:
+        return []
+
+    descendants = (
+        Page.objects.filter(
+            path__startswith=page.path,
+            depth__gt=page.depth,
+            depth__lte=page.depth + max_depth + 1,
+            live=True,
+            show_in_menus=True,
+        )
+        .order_by('path')
+        .only('id', 'path', 'depth', 'title', 'url_path')
+    )
+
+    steplen = Page.steplen
+    nodes = {page.path: NavigationNode(page.title, None, page.depth)}
+    for descendant in descendants:
+        parent = nodes.get(descendant.path[:-steplen])
+        if parent is None:
+            # An ancestor is either hidden from menus or not live.
+            continue
+        parent.has_children = True
+        if descendant.depth > page.depth + max_depth:
+            continue
+        node = NavigationNode(
+            descendant.title, descendant.get_url(request), descendant.depth
+        )
+        parent.children.append(node)
+        nodes[descendant.path] = node
+
+    return nodes[page.path].children
+
+
+def get_tree_version():
+    """
+    Site-wide version of the page tree. Anything derived from the
+    tree structure can be cached against it.
+    """
+    return get_generation(TREE_GENERATION)
+
+
+def bump_tree_version():
+    return bump_generation(TREE_GENERATION)
+
+
+def get_menu_items(page):
+    """
+    Return the live, in-menu children of a page as a list of
+    dictionaries with 'title' and 'url' keys. Results are cached
+    until the tree version changes.
+
+    Args:
+        page (obj): the parent page.
+
+    Returns:
+        A list of dictionaries.
+    """
+    key = f'navigation:menu:{page.pk}:{get_tree_version()}'
+    menu_items = cache.get(key)
+    if menu_items is None:
+        menu_items = [
+            {'title': child.title, 'url': child.url}
+            for child in page.get_children()
+            .live()
+            .in_menu()
+            .only('id', 'path', 'depth', 'title', 'url_path')
+        ]
+        cache.set(key, menu_items, NAVIGATION_CACHE_TIMEOUT)
+    return menu_items
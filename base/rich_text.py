@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from wagtail.documents.rich_text import DocumentLinkHandler as BaseDocumentLinkHandler
+from wagtail.rich_text.pages import PageLinkHandler as BasePageLinkHandler
+
+# Link targets loaded ahead of rendering, keyed by link type and then
+# by id as a string, see preloaded_links.
+_preloaded = ContextVar('preloaded_links', default=None)
+
+
+class PreloadedLinksMixin:
+    """
+    Link handler that looks up link targets among the preloaded ones
+    first, and only queries the database for the others.
+    """
+
+    @classmethod
+    def get_many(cls, attrs_list):
+        preloaded = (_preloaded.get() or {}).get(cls.identifier)
+        if preloaded is not None:
+            ids = [str(attrs.get('id')) for attrs in attrs_list]
+            if all(link_id in preloaded for link_id in ids):
+                return [preloaded[link_id] for link_id in ids]
+        return super().get_many(attrs_list)
+
+
+class PageLinkHandler(PreloadedLinksMixin, BasePageLinkHandler):
+    pass
+
+
+class DocumentLinkHandler(PreloadedLinksMixin, BaseDocumentLinkHandler):
+    pass
+
+
+@contextmanager
+def preloaded_links(links):
+    """
+    Load the targets of many rich text links at once, with one query
+    per link type, for the links expanded within the with block.
+
+    Args:
+        links (dict): link types, e.g. 'page', mapped to sets of ids.
+    """
+    # Wagtail's own handlers load many links together.
+    handlers = {
+        handler.identifier: handler
+        for handler in (BasePageLinkHandler, BaseDocumentLinkHandler)
+    }
+    preloaded = {}
+    for link_type, ids in links.items():
+        ids = sorted(str(link_id) for link_id in ids)
+        if link_type in handlers and ids:
+            instances = handlers[link_type].get_many([{'id': link_id} for link_id in ids])
+            preloaded[link_type] = dict(zip(ids, instances))
+
+    token = _preloaded.set(preloaded)
+    try:
+        yield
+    finally:
+        _preloaded.reset(token)
@@ -0,0 +1,112 @@
+from django.db.models import prefetch_related_objects
+from wagtail.contrib.settings.models import BaseGenericSetting, BaseSiteSetting
+from wagtail.contrib.settings.registry import registry
+from wagtail.images.models import AbstractImage
+
+from base.cache import ProcessCache, bump_generation
+from base.navigation import TREE_GENERATION
+from base.sites import find_site_for_request
+
+SETTINGS_GENERATION = 'settings'
+
+# Settings link to pages, so their URLs also depend on the page tree.
+_settings = ProcessCache(SETTINGS_GENERATION, TREE_GENERATION)
+
+
+def get_generic_settings():
+    """
+    Return every registered generic setting, keyed by model.
+
+    All settings are loaded together with the objects they point to
+    (see the select_related attribute on each setting model) and the
+    renditions of their images, then kept for the lifetime of the
+    process until a setting, image, document or page changes.
+
+    Returns:
+        A dictionary mapping setting models to instances.
+    """
+    return _settings.get_or_set('generic', _load_generic_settings)
+
+
+def _load_generic_settings():
+    instances = {
+        model: model._get_or_create()
+        for model in registry
+        if issubclass(model, BaseGenericSetting)
+    }
+    _prefetch_renditions(instances.values())
+    return instances
+
+
+def get_site_settings(site):
+    """
+    Return every registered site setting for a site, keyed by model.
+
+    Like generic settings, they are loaded once per process for each
+    site and kept until a setting, image, document or page changes.
+
+    Args:
+        site (obj): Site object.
+
+    Returns:
+        A dictionary mapping setting models to instances.
+    """
+    return _settings.get_or_set(('site', site.pk), lambda: _load_site_settings(site))
+
+
+def _load_site_settings(site):
+    instances = {
+        model: model.for_site(site)
+        for model in registry
+        if issubclass(model, BaseSiteSetting)
+    }
+    _prefetch_renditions(instances.values())
+    return instances
+
+
+def get_site_setting(model, request):
+    """
+    Cached counterpart of model.for_request(request) for site settings.
+
+    Args:
+        model (class): a registered BaseSiteSetting subclass.
+        request (obj): request object.
+
+    Returns:
+        An instance of model for the request's site.
+    """
+    site = find_site_for_request(request)
+    if site is None:
+        # Raises DoesNotExist, as for_request would.
+        return model.for_site(site)
+    return get_site_settings(site)[model]
+
+
+def _prefetch_renditions(instances):
+    images = []
+    for instance in instances:
+        for field_name in instance.select_related or []:
+            related = getattr(instance, field_name)
+            if isinstance(related, AbstractImage):
+                images.append(related)
+    prefetch_related_objects(images, 'renditions')
+
+
+def prime_request(request):
+    """
+    Store the cached settings on the request where Wagtail's settings
+    lookups (the settings context processor, {% get_settings %},
+    Setting.load(request) and Setting.for_request(request)) expect to
+    find them.
+    """
+    for model, instance in get_generic_settings().items():
+        setattr(request, model.get_cache_attr_name(), instance)
+
+    site = find_site_for_request(request)
+    if site is not None:
+        for model, instance in get_site_settings(site).items():
+            setattr(request, model.get_cache_attr_name(), instance)
+
+
+def invalidate_settings():
+    bump_generation(SETTINGS_GENERATION)
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wagtail.contrib.settings.models import BaseGenericSetting, BaseSiteSetting
+from wagtail.documents import get_document_model
+from wagtail.images import get_image_model
+from wagtail.models import Page, Site
+from wagtail.signals import page_published, page_unpublished, post_page_move
+
+from base.bodies import invalidate_bodies
+from base.models import InteractiveDiagram
+from base.navigation import bump_tree_version
+from base.settings_cache import invalidate_settings
+from base.sites import invalidate_sites
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_page_move)
+def page_tree_changed(sender, **kwargs):
+    bump_tree_version()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def page_saved_or_deleted(sender, instance, **kwargs):
+    """
+    Catch pages created or deleted outside of the publishing workflow,
+    e.g. by management commands. Saves that only touch a subset of
+    fields (such as saving a draft revision) leave the tree alone.
+
+    Cached sites depend on the tree version too, so this also refreshes
+    their root pages when one is saved.
+    """
+    if isinstance(instance, Page) and not kwargs.get('update_fields'):
+        bump_tree_version()
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def site_saved_or_deleted(sender, **kwargs):
+    invalidate_sites()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def setting_saved_or_deleted(sender, instance, created=False, **kwargs):
+    # Settings rows are created with their defaults the first time they
+    # are loaded, which leaves nothing cached stale.
+    if isinstance(instance, (BaseGenericSetting, BaseSiteSetting)) and not created:
+        invalidate_settings()
+
+
+@receiver(post_save, sender=InteractiveDiagram)
+def interactive_diagram_saved(sender, instance, **kwargs):
+    instance.render_svg()
+
+
+@receiver(post_save, sender=get_image_model())
+@receiver(post_delete, sender=get_image_model())
+@receiver(post_save, sender=get_document_model())
+@receiver(post_delete, sender=get_document_model())
+def media_saved_or_deleted(sender, **kwargs):
+    invalidate_settings()
+    invalidate_bodies()
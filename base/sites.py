@@ -0,0 +1,62 @@
+from django.http.request import split_domain_port
+from wagtail.models import Site
+from wagtail.models.sites import get_site_for_hostname
+
+from base.cache import ProcessCache, bump_generation
+from base.navigation import TREE_GENERATION
+
+SITES_GENERATION = 'sites'
+
+# Process-wide map of (hostname, port) to the matching Site, with its
+# root page already loaded. The root page goes stale when the page tree
+# changes, e.g. its numchild when a child is added.
+_sites_by_host = ProcessCache(SITES_GENERATION, TREE_GENERATION)
+
+
+def get_site_for_host(hostname, port):
+    """
+    Resolve a hostname and port to a Site the same way Wagtail does,
+    but remember the answer for the lifetime of the process.
+
+    Args:
+        hostname (str): hostname without the port.
+        port (int): port number.
+
+    Returns:
+        A Site with root_page selected, or None.
+    """
+
+    def find_site():
+        try:
+            return get_site_for_hostname(hostname, port)
+        except Site.DoesNotExist:
+            return None
+
+    return _sites_by_host.get_or_set((hostname, port), find_site)
+
+
+def find_site_for_request(request):
+    """
+    Drop-in replacement for Site.find_for_request that goes through the
+    process-wide map. The result is memoized on the request using the
+    same attribute as Wagtail, so Wagtail's own lookups reuse it.
+    """
+    if request is None:
+        return None
+
+    if not hasattr(request, '_wagtail_site'):
+        # Use `_get_raw_host` to avoid ALLOWED_HOSTS checks, like Wagtail.
+        hostname = split_domain_port(request._get_raw_host())[0]
+        request._wagtail_site = get_site_for_host(hostname, request.get_port())
+    return request._wagtail_site
+
+
+def get_site_root(request):
+    site = find_site_for_request(request)
+    if site is None:
+        return None
+    return site.root_page
+
+
+def invalidate_sites():
+    bump_generation(SITES_GENERATION)
@@ -1,6 +1,16 @@
 from django import template
+from django.core.cache import cache
 from django.utils.safestring import mark_safe
 
+from base.bodies import render_body
+from base.models import InteractiveDiagram
+from base.navigation import (
+    NAVIGATION_CACHE_TIMEOUT,
+    get_nested_pages,
+    get_tree_version,
+)
+from base.settings_cache import get_generic_settings
+
 register = template.Library()
 
 
@@ -15,32 +25,46 @@ def limit(value, arg):
         return value
 
 
-@register.filter
-def has_h2_block(body):
-    """Check if a StreamField body contains an h2 block."""
-    for block in body:
-        if block.block_type == 'h2':
-            return True
-    return False
+@register.simple_tag(takes_context=True)
+def page_body(context, page):
+    """Rendered blocks of a page body, with a has_h2 flag, cached
+    against the page's live revision, see base.bodies.render_body."""
+    return render_body(page, context.get('request'))
+
+
+def _render_navigation_nodes(nodes):
+    output = []
+    for node in nodes:
+        output.append(f'<li class="nav-item"><a class="nav-link" href="{node.url}">{node.title}</a>')
+        if node.has_children:
+            output.append('<ul class="nav flex-column">')
+            output.append(_render_navigation_nodes(node.children))
+            output.append('</ul>')
+        output.append('</li>')
+
+    return '\n'.join(output)
 
 
 @register.simple_tag(takes_context=True)
 def render_nested_pages(context, page, max_depth=1, current_depth=1):
-    """Recursive template tag for displaying a sitemap for a section
-    of the site."""
+    """Template tag for displaying a sitemap for a section of the site.
+    The whole subtree is loaded in a single query, see
+    base.navigation.get_nested_pages, and the rendered markup is
+    cached until the page tree changes."""
     if current_depth > max_depth:
         return ''
 
-    output = []
-    for child in page.get_children().specific():
-        if child.live and child.show_in_menus:
-            output.append(f'<li class="nav-item"><a class="nav-link" href="{child.url}">{child.title}</a>')
-            if child.get_children().filter(live=True, show_in_menus=True).exists():
-                output.append('<ul class="nav flex-column">')
-                output.append(
-                    render_nested_pages(context, child, max_depth, current_depth + 1)
-                )
-                output.append('</ul>')
-            output.append('</li>')
-
-    return mark_safe('\n'.join(output))
+    depth = max_depth - current_depth + 1
+    key = f'navigation:nested:{page.pk}:{depth}:{get_tree_version()}'
+    output = cache.get(key)
+    if output is None:
+        output = _render_navigation_nodes(get_nested_pages(page, depth))
+        cache.set(key, output, NAVIGATION_CACHE_TIMEOUT)
+    return mark_safe(output)
+
+
+@register.simple_tag
+def interactive_diagram():
+    """Pre-rendered markup for the interactive research data lifecycle
+    diagram, see InteractiveDiagram.get_svg."""
+    return get_generic_settings()[InteractiveDiagram].get_svg()
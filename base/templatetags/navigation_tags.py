@@ -1,9 +1,20 @@
 from django import template
-from wagtail.models import Site
+
+from base.navigation import get_menu_items as _get_menu_items
+from base.sites import get_site_root as _get_site_root
 
 register = template.Library()
 
 
 @register.simple_tag(takes_context=True)
 def get_site_root(context):
-    return Site.find_for_request(context["request"]).root_page
+    return _get_site_root(context["request"])
+
+
+@register.simple_tag
+def get_menu_items(page):
+    """Live, in-menu children of a page, cached until the page tree
+    changes. Each item has a title and a url."""
+    if page is None:
+        return []
+    return _get_menu_items(page)
@@ -1,3 +1,445 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from wagtail.documents import get_document_model
+from wagtail.models import Page
+
+from base.models import (
+    FloatingFooterButton,
+    FooterLogo,
+    InteractiveDiagram,
+    MainLogo,
+    StandardPage,
+)
+from base.bodies import MEDIA_GENERATION, render_body
+from base.cache import increment_generation
+from base.listings import populate_listing_excerpts
+from base.navigation import get_menu_items, get_nested_pages
+from base.settings_cache import (
+    SETTINGS_GENERATION,
+    get_generic_settings,
+    prime_request,
+)
+from base.sites import find_site_for_request, get_site_root
+from base.templatetags.basic_tags import interactive_diagram, render_nested_pages
+
+
+class NestedPagesTestCase(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(depth=2)
+        self.section = self.add_page(self.home, 'Section')
+
+    def add_page(self, parent, title, **kwargs):
+        page = StandardPage(title=title, slug=title.lower().replace(' ', '-'), **kwargs)
+        parent.add_child(instance=page)
+        return page
+
+    def test_render_nested_pages_markup(self):
+        first = self.add_page(self.section, 'First')
+        self.add_page(first, 'First Child')
+        self.add_page(self.section, 'Hidden', show_in_menus=False)
+        second = self.add_page(self.section, 'Second')
+        self.add_page(second, 'Draft', live=False)
+
+        html = render_nested_pages({}, self.section, 2)
+
+        self.assertEqual(
+            html,
+            '\n'.join(
+                [
+                    '<li class="nav-item"><a class="nav-link" href="/section/first/">First</a>',
+                    '<ul class="nav flex-column">',
+                    '<li class="nav-item"><a class="nav-link" href="/section/first/first-child/">First Child</a>',
+                    '</li>',
+                    '</ul>',
+                    '</li>',
+                    '<li class="nav-item"><a class="nav-link" href="/section/second/">Second</a>',
+                    '</li>',
+                ]
+            ),
+        )
+
+    def test_render_nested_pages_stops_at_max_depth(self):
+        first = self.add_page(self.section, 'First')
+        self.add_page(first, 'First Child')
+
+        html = render_nested_pages({}, self.section, 1)
+
+        self.assertNotIn('First Child', html)
+        self.assertIn('<ul class="nav flex-column">\n\n</ul>', html)
+
+    def test_render_nested_pages_query_count_is_constant(self):
+        for i in range(3):
+            child = self.add_page(self.section, f'Child {i}')
+            for j in range(3):
+                grandchild = self.add_page(child, f'Grandchild {i} {j}')
+                self.add_page(grandchild, f'Leaf {i} {j}')
+
+        # Warm up the site root paths cache used for URL generation.
+        get_nested_pages(self.section, 3)
+
+        with self.assertNumQueries(1):
+            get_nested_pages(self.section, 3)
+
+    def test_render_nested_pages_is_cached_until_the_tree_changes(self):
+        self.add_page(self.section, 'First')
+        render_nested_pages({}, self.section, 1)
+
+        with self.assertNumQueries(0):
+            render_nested_pages({}, self.section, 1)
+
+        self.add_page(self.section, 'Second')
+
+        self.assertIn('Second', render_nested_pages({}, self.section, 1))
+
+
+class MenuItemsTestCase(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(depth=2)
+        self.about = StandardPage(title='About', slug='about')
+        self.home.add_child(instance=self.about)
+
+    def test_menu_items_are_cached_until_the_tree_changes(self):
+        self.assertEqual(
+            get_menu_items(self.home), [{'title': 'About', 'url': '/about/'}]
+        )
+
+        with self.assertNumQueries(0):
+            get_menu_items(self.home)
+
+        self.about.unpublish()
+
+        self.assertEqual(get_menu_items(self.home), [])
+
+    def test_header_lists_menu_items(self):
+        response = self.client.get('/')
+
+        self.assertContains(response, '<a class="nav-link" href="/about/">About</a>')
+
+    def test_child_pages_listing_skips_menu_items_when_hidden(self):
+        self.home.show_nested_children = False
+
+        with patch('base.templatetags.navigation_tags._get_menu_items') as menu_items:
+            html = render_to_string(
+                'base/includes/child_pages_listing.html', {'page': self.home}
+            )
+
+        menu_items.assert_not_called()
+        self.assertNotIn('Further Reading', html)
+
+    def test_standard_page_skips_menu_items_when_hidden(self):
+        self.about.add_child(instance=StandardPage(title='Team', slug='team'))
+        self.about.show_nested_children = False
+        self.about.save_revision().publish()
+
+        with patch(
+            'base.templatetags.navigation_tags._get_menu_items',
+            wraps=get_menu_items,
+        ) as menu_items:
+            response = self.client.get('/about/')
+
+        called_for = [call.args[0].pk for call in menu_items.mock_calls]
+        self.assertNotIn(self.about.pk, called_for)
+        self.assertNotContains(response, 'Further Reading')
+
+        self.about.show_nested_children = True
+        self.about.save_revision().publish()
+
+        self.assertContains(self.client.get('/about/'), 'Further Reading')
+
+
+class HomePageSectionsTestCase(TestCase):
+    def setUp(self):
+        increment_generation(SETTINGS_GENERATION)
+        get_generic_settings()
+        self.home = Page.objects.get(depth=2).specific
+        self.sections = []
+
+    def add_section(self, title, children):
+        parent = StandardPage(title=title, slug=title.lower())
+        self.home.add_child(instance=parent)
+        for number in range(children):
+            parent.add_child(
+                instance=StandardPage(
+                    title=f'{title} {number}',
+                    slug=f'{title.lower()}-{number}',
+                    body=[('paragraph', f'<p>{title} body {number}</p>')],
+                )
+            )
+        self.sections.append(('section', {'heading': title, 'page': parent, 'count': 2}))
+        self.home.sections = self.sections
+        self.home.save()
+
+    def get_home_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_sections_show_their_first_children(self):
+        self.add_section('Guides', 3)
+        self.add_section('Tools', 1)
+
+        response, queries = self.get_home_queries()
+
+        self.assertContains(response, 'Guides body 0')
+        self.assertContains(response, 'Guides body 1')
+        self.assertNotContains(response, 'Guides body 2')
+        self.assertContains(response, 'Tools body 0')
+
+    def test_query_count_does_not_grow_with_sections(self):
+        self.add_section('Guides', 2)
+        self.get_home_queries()
+        response, queries = self.get_home_queries()
+
+        self.add_section('Tools', 3)
+        self.add_section('Training', 3)
+        self.get_home_queries()
+
+        self.assertEqual(self.get_home_queries()[1], queries)
+
+
+class ListingExcerptTestCase(TestCase):
+    def test_excerpts_cut_inside_a_link_are_closed(self):
+        link = '<a linktype="page" id="2">home page</a>'
+        page = StandardPage(
+            title='Guide',
+            slug='guide',
+            body=[('paragraph', '<p>' + 'y' * 295 + f' {link} and more</p>')],
+        )
+
+        excerpt, text = page.get_listing_excerpt()
+
+        self.assertEqual(
+            excerpt, '<p>' + 'y' * 295 + ' <a linktype="page" id="2">hom…</a></p>'
+        )
+        self.assertEqual(text, 'y' * 295 + ' hom…')
+
+    def test_command_fills_in_missing_excerpts(self):
+        page = StandardPage(
+            title='Guide', slug='guide', body=[('paragraph', '<p>How to</p>')]
+        )
+        Page.objects.get(depth=2).add_child(instance=page)
+        StandardPage.objects.filter(pk=page.pk).update(
+            listing_excerpt='', listing_excerpt_text=''
+        )
+
+        call_command('update_listing_excerpts', stdout=StringIO())
+
+        page.refresh_from_db()
+        self.assertEqual(page.listing_excerpt, '<p>How to</p>')
+        self.assertEqual(page.listing_excerpt_text, 'How to')
+
+    def test_migrations_fill_in_excerpts_of_existing_pages(self):
+        page = StandardPage(
+            title='Guide', slug='guide', body=[('paragraph', '<p>How to</p>')]
+        )
+        Page.objects.get(depth=2).add_child(instance=page)
+        StandardPage.objects.filter(pk=page.pk).update(
+            listing_excerpt='', listing_excerpt_text=''
+        )
+
+        with patch('base.signals.bump_tree_version') as bump_tree_version:
+            populate_listing_excerpts(StandardPage)
+
+        bump_tree_version.assert_not_called()
+        page.refresh_from_db()
+        self.assertEqual(page.listing_excerpt, '<p>How to</p>')
+        self.assertEqual(page.listing_excerpt_text, 'How to')
+
+
+class BodyCacheTestCase(TestCase):
+    def setUp(self):
+        self.page = StandardPage(
+            title='Guide',
+            slug='guide',
+            body=[('h2', 'Overview'), ('paragraph', '<p>How to</p>')],
+        )
+        Page.objects.get(depth=2).add_child(instance=self.page)
+        self.page.save_revision().publish()
+
+    def test_body_is_rendered_once_per_revision(self):
+        body = render_body(self.page)
+        self.assertIn('How to', body['html'])
+        self.assertTrue(body['has_h2'])
+
+        with patch('base.bodies.render_to_string') as render_to_string:
+            self.assertEqual(render_body(self.page), body)
+        render_to_string.assert_not_called()
+
+        self.page.body = [('paragraph', '<p>How to, revised</p>')]
+        self.page.save_revision().publish()
+
+        body = render_body(self.page)
+        self.assertIn('How to, revised', body['html'])
+        self.assertFalse(body['has_h2'])
+
+    def test_body_is_rendered_again_after_a_deploy(self):
+        render_body(self.page)
+
+        with (
+            patch('base.bodies.get_templates_version', return_value='changed'),
+            patch('base.bodies.render_to_string', return_value='') as render_to_string,
+        ):
+            render_body(self.page)
+        render_to_string.assert_called_once()
+
+        with (
+            patch('base.bodies.BODY_CACHE_VERSION', 0),
+            patch('base.bodies.render_to_string', return_value='') as render_to_string,
+        ):
+            render_body(self.page)
+        render_to_string.assert_called_once()
+
+    def test_previews_are_not_cached(self):
+        render_body(self.page)
+        request = RequestFactory().get('/')
+        request.is_preview = True
+
+        with patch('base.bodies.render_to_string', return_value='') as render_to_string:
+            render_body(self.page, request)
+        render_to_string.assert_called_once()
+
+
+class BodyLinksTestCase(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(depth=2)
+        self.page = StandardPage(title='Guide', slug='guide')
+        self.home.add_child(instance=self.page)
+        self.document = get_document_model().objects.create(
+            title='Data', file='documents/data.csv'
+        )
+
+    def get_render_queries(self, targets):
+        self.page.body = [
+            (
+                'paragraph',
+                f'<p><a linktype="page" id="{target.pk}">{target.title}</a> '
+                f'<a linktype="document" id="{self.document.pk}">Data</a></p>',
+            )
+            for target in targets
+        ]
+        # Render afresh rather than from the cache.
+        increment_generation(MEDIA_GENERATION)
+        with CaptureQueriesContext(connection) as queries:
+            body = render_body(self.page)
+        return body, len(queries)
+
+    def test_rich_text_links_are_loaded_together(self):
+        targets = []
+        for number in range(6):
+            target = StandardPage(title=f'Target {number}', slug=f'target-{number}')
+            self.home.add_child(instance=target)
+            targets.append(target)
+
+        # Warm up the site root paths, which are cached separately.
+        self.get_render_queries(targets[:1])
+        body, queries = self.get_render_queries(targets[:2])
+        self.assertIn('<a href="/target-1/">Target 1</a>', body['html'])
+        self.assertIn(f'<a href="{self.document.url}">Data</a>', body['html'])
+
+        body, more_queries = self.get_render_queries(targets)
+        self.assertIn('<a href="/target-5/">Target 5</a>', body['html'])
+        self.assertEqual(more_queries, queries)
+
+
+class SiteResolutionTestCase(TestCase):
+    def test_site_is_resolved_once_per_process(self):
+        request = RequestFactory().get('/')
+        site = find_site_for_request(request)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site_root(RequestFactory().get('/')), site.root_page)
+
+    def test_site_map_is_invalidated_when_a_site_is_saved(self):
+        site = find_site_for_request(RequestFactory().get('/'))
+        site.site_name = 'Research Data'
+        site.save()
+
+        with self.assertNumQueries(1):
+            new_site = find_site_for_request(RequestFactory().get('/'))
+        self.assertEqual(new_site.site_name, 'Research Data')
+
+    def test_root_pages_are_refreshed_without_looking_up_sites(self):
+        site = find_site_for_request(RequestFactory().get('/'))
+        page = StandardPage(title='About', slug='about')
+        site.root_page.add_child(instance=page)
+
+        with CaptureQueriesContext(connection) as queries:
+            page.save()
+        self.assertFalse(
+            any(
+                'WHERE "wagtailcore_site"."root_page_id"' in query['sql']
+                for query in queries.captured_queries
+            )
+        )
+
+        root_page = site.root_page
+        root_page.title = 'Research Data'
+        root_page.save()
+        self.assertEqual(get_site_root(RequestFactory().get('/')).title, 'Research Data')
+
+
+class GenericSettingsTestCase(TestCase):
+    def test_generic_settings_are_loaded_once(self):
+        generic_settings = get_generic_settings()
+        # Also resolve the site and load its settings, which prime_request
+        # stores on the request too.
+        prime_request(RequestFactory().get('/'))
+
+        self.assertEqual(
+            set(generic_settings),
+            {MainLogo, FooterLogo, FloatingFooterButton, InteractiveDiagram},
+        )
+        with self.assertNumQueries(0):
+            request = RequestFactory().get('/')
+            prime_request(request)
+            self.assertIs(
+                MainLogo.load(request_or_site=request), generic_settings[MainLogo]
+            )
+
+    def test_generic_settings_are_invalidated_on_save(self):
+        button = get_generic_settings()[FloatingFooterButton]
+        button.text = 'Feedback'
+        button.save()
+
+        self.assertEqual(get_generic_settings()[FloatingFooterButton].text, 'Feedback')
+
+
+class InteractiveDiagramTestCase(TestCase):
+    def test_diagram_is_rendered_once_per_version(self):
+        diagram = get_generic_settings()[InteractiveDiagram]
+        svg = diagram.get_svg()
+
+        self.assertIn('<desc id="lifecycle-desc">', svg)
+        self.assertIn('href="/research-lifecycle/plan-design/"', svg)
+        with patch.object(InteractiveDiagram, 'render_svg') as render_svg:
+            self.assertEqual(interactive_diagram(), svg)
+        render_svg.assert_not_called()
+
+    def test_diagram_is_rendered_on_save(self):
+        diagram = get_generic_settings()[InteractiveDiagram]
+        diagram.phase1_text = 'Plan'
+        diagram.save()
+
+        with patch.object(InteractiveDiagram, 'render_svg') as render_svg:
+            self.assertIn('fill="#800000"', interactive_diagram())
+        render_svg.assert_not_called()
+
+    def test_diagram_is_rendered_again_when_templates_change(self):
+        diagram = get_generic_settings()[InteractiveDiagram]
+        diagram.get_svg()
+
+        with (
+            patch('base.models.get_templates_version', return_value='changed'),
+            patch.object(
+                InteractiveDiagram, 'render_svg', return_value='<svg></svg>'
+            ) as render_svg,
+        ):
+            self.assertEqual(diagram.get_svg(), '<svg></svg>')
+        render_svg.assert_called_once_with()
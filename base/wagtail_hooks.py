@@ -0,0 +1,14 @@
+from wagtail import hooks
+
+from base.rich_text import DocumentLinkHandler, PageLinkHandler
+
+
+@hooks.register('register_rich_text_features', order=1)
+def register_link_handlers(features):
+    """
+    Replace Wagtail's page and document link handlers with ones that
+    can use links loaded for a whole page body at once. Runs after
+    Wagtail's own hooks so that these win.
+    """
+    features.register_link_type(PageLinkHandler)
+    features.register_link_type(DocumentLinkHandler)
@@ -0,0 +1,111 @@
+import random
+import statistics
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from wagtail.models import Page
+from wagtail.search.backends.database.fallback import DatabaseSearchBackend
+from wagtail.search.backends.database.sqlite.sqlite import SQLiteSearchBackend
+
+from search.backends import FTS5SearchBackend
+
+VOCABULARY = (
+    'data storage research computing cluster archive repository survey '
+    'analysis visualization statistics genomics imaging notebook workflow '
+    'metadata curation sharing publication funder policy compliance grant '
+    'security privacy consent library division consultation training '
+    'software python database backup cloud server network collaboration '
+    'preservation citation identifier license embargo replication'
+).split()
+
+QUERIES = [
+    'data',
+    'storage cluster',
+    'stor',
+    'research data management',
+    'genomics imaging workflow',
+    'nonexistentterm',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares search latency of the LIKE fallback, Wagtail\'s SQLite FTS5 '
+        'backend and search.backends on a synthetic corpus. Nothing is kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+
+        with transaction.atomic():
+            parent = self.create_corpus(options['pages'])
+            self.stdout.write(f'Indexed {options["pages"]} synthetic pages.')
+
+            backends = [
+                ('LIKE fallback', DatabaseSearchBackend({})),
+                ('Wagtail FTS5', SQLiteSearchBackend({})),
+                ('Ranked FTS5', FTS5SearchBackend({})),
+            ]
+            for name, backend in backends:
+                self.benchmark(name, backend, parent, options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def create_corpus(self, count):
+        root = Page.get_first_root_node()
+        parent = root.add_child(
+            instance=Page(title='Search benchmark', slug='search-benchmark')
+        )
+        content_type = ContentType.objects.get_for_model(Page)
+
+        pages = []
+        for number in range(1, count + 1):
+            title = ' '.join(random.choices(VOCABULARY, k=random.randint(3, 8)))
+            slug = f'benchmark-{number}'
+            pages.append(
+                Page(
+                    title=title,
+                    draft_title=title,
+                    slug=slug,
+                    path=Page._get_path(parent.path, parent.depth + 1, number),
+                    depth=parent.depth + 1,
+                    url_path=f'{parent.url_path}{slug}/',
+                    content_type=content_type,
+                    locale_id=parent.locale_id,
+                    live=True,
+                )
+            )
+        pages = Page.objects.bulk_create(pages, batch_size=500)
+        Page.objects.filter(pk=parent.pk).update(numchild=count)
+
+        backend = FTS5SearchBackend({})
+        for start in range(0, len(pages), 500):
+            backend.add_bulk(Page, pages[start : start + 500])
+
+        return parent
+
+    def benchmark(self, name, backend, parent, repeat):
+        queryset = Page.objects.live().child_of(parent)
+        timings = []
+        matches = []
+        for query in QUERIES:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                results = backend.search(query, queryset)
+                list(results[:10])
+                timings.append((time.perf_counter() - started) * 1000)
+            matches.append(f'{query!r}: {results.count()}')
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{name}: median {statistics.median(timings):.1f} ms, '
+            f'p95 {p95:.1f} ms ({", ".join(matches)})'
+        )
@@ -2,7 +2,7 @@ from django.db import models
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel
 from wagtail.fields import RichTextField, StreamField
 
-from base.models import AbstractBasePage, SectionBlock
+from base.models import AbstractBasePage, SectionBlock, prepare_sections
 
 
 class HomePage(AbstractBasePage):
@@ -94,3 +94,14 @@ class HomePage(AbstractBasePage):
         'news.NewsIndexPage',
         'services.ServicesListingPage',
     ]
+
+    def get_context(self, request, *args, **kwargs):
+        """
+        Prepare the child pages of every section in one pass, rather
+        than letting each SectionBlock load its own.
+        """
+        context = super().get_context(request, *args, **kwargs)
+        context['prepared_sections'] = prepare_sections(
+            block.value for block in self.sections if block.block_type == 'section'
+        )
+        return context
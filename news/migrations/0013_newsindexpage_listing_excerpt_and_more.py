@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0012_alter_newsindexpage_body_alter_newspage_body'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsindexpage',
+            name='listing_excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='newsindexpage',
+            name='listing_excerpt_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='newspage',
+            name='listing_excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='newspage',
+            name='listing_excerpt_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -1,10 +1,16 @@
+from base.cache import get_generation
+from base.listings import load_children, paginate_by_keyset
 from base.models import AbstractBasePage
-from django.core.paginator import Paginator
+from base.settings_cache import get_site_setting
+from django.core.cache import cache
 from django.db import models
+from django.db.models import prefetch_related_objects
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel
 from wagtail.contrib.settings.models import BaseSiteSetting, register_setting
 from wagtail.fields import RichTextField
 
+NEWS_GENERATION = 'news'
+
 
 @register_setting(icon='calendar-alt')
 class NewsListingSettings(BaseSiteSetting):
@@ -20,20 +26,78 @@ class NewsListingSettings(BaseSiteSetting):
 class NewsIndexPage(AbstractBasePage):
     subpage_types = ['news.NewsPage']
 
+    def get_news_count(self):
+        """
+        Return the number of live stories below this page, cached until
+        a story is published, unpublished, moved or deleted.
+        """
+        key = f'news:count:{self.pk}:{get_generation(NEWS_GENERATION)}'
+        count = cache.get(key)
+        if count is None:
+            count = NewsPage.objects.child_of(self).live().count()
+            cache.set(key, count, None)
+        return count
+
+    @classmethod
+    def get_section_children(cls, parents, count):
+        """
+        Latest stories of news index pages shown in page sections (see
+        base.models.prepare_sections). Ordering and limiting happen in
+        the database, bodies stay deferred as section cards leave out
+        excerpts, and thumbnails come with their renditions.
+
+        Args:
+            parents (list): news index pages.
+            count (int): maximum number of stories per news index page.
+
+        Returns:
+            A dictionary mapping parent page ids to lists of stories.
+        """
+        children = load_children(
+            parents,
+            count,
+            NewsPage.objects.select_related('thumbnail'),
+            order_by=('-first_published_at', '-pk'),
+        )
+        prefetch_related_objects(
+            [
+                story.thumbnail
+                for stories in children.values()
+                for story in stories
+                if story.thumbnail
+            ],
+            'renditions',
+        )
+        return children
+
     def get_context(self, request):
         context = super().get_context(request)
 
-        child_pages = self.get_children().live().specific().order_by('-first_published_at')
+        child_pages = (
+            NewsPage.objects.child_of(self)
+            .live()
+            .select_related('thumbnail')
+            .defer_streamfields()
+        )
 
-        news_listing_settings = NewsListingSettings.for_request(request=request)
+        news_listing_settings = get_site_setting(NewsListingSettings, request)
 
         num_items = 5
         if news_listing_settings.paginate_by:
             num_items = news_listing_settings.paginate_by
 
-        paginator = Paginator(child_pages, num_items)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        page_obj = paginate_by_keyset(
+            child_pages,
+            request,
+            num_items,
+            self.get_news_count(),
+            'first_published_at',
+        )
+
+        prefetch_related_objects(
+            [child.thumbnail for child in page_obj if child.thumbnail],
+            'renditions',
+        )
 
         context['page_obj'] = page_obj
         return context
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wagtail.signals import page_published, page_unpublished, post_page_move
+
+from base.cache import bump_generation
+from news.models import NEWS_GENERATION, NewsPage
+
+
+@receiver(page_published, sender=NewsPage)
+@receiver(page_unpublished, sender=NewsPage)
+@receiver(post_page_move, sender=NewsPage)
+@receiver(post_delete, sender=NewsPage)
+def news_page_changed(sender, **kwargs):
+    bump_generation(NEWS_GENERATION)
+
+
+@receiver(post_save, sender=NewsPage)
+def news_page_saved(sender, instance, **kwargs):
+    # Saving a draft revision only touches a few fields on the live page.
+    if not kwargs.get('update_fields'):
+        bump_generation(NEWS_GENERATION)
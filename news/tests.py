@@ -1,3 +1,212 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from wagtail.models import Page
 
-# Create your tests here.
+from base.cache import increment_generation
+from base.models import SectionBlock, prepare_sections
+from base.settings_cache import (
+    SETTINGS_GENERATION,
+    get_generic_settings,
+    get_site_setting,
+    get_site_settings,
+    prime_request,
+)
+from base.sites import find_site_for_request
+from news.models import NewsIndexPage, NewsListingSettings, NewsPage
+
+
+class NewsTestCase(TestCase):
+    def setUp(self):
+        # Create the generic settings rows up front, as saving them
+        # invalidates the settings cache. The cache outlives each test's
+        # transaction, so force a fresh load first.
+        increment_generation(SETTINGS_GENERATION)
+        get_generic_settings()
+
+        home = Page.objects.get(depth=2)
+        self.news_index = NewsIndexPage(title='News', slug='news')
+        home.add_child(instance=self.news_index)
+
+    def add_story(self, title, excerpt='', body_text='Story body'):
+        story = NewsPage(
+            title=title,
+            slug=title.lower().replace(' ', '-'),
+            excerpt=excerpt,
+            body=[('paragraph', f'<p>{body_text}</p>')],
+        )
+        self.news_index.add_child(instance=story)
+        return story
+
+
+class NewsIndexPageTestCase(NewsTestCase):
+    def get_index_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/news/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_excerpt_falls_back_to_the_body(self):
+        self.add_story('First', excerpt='<p>Short version</p>')
+        self.add_story('Second', body_text='Longer body text')
+
+        response = self.client.get('/news/')
+
+        self.assertContains(response, 'Short version')
+        self.assertContains(response, 'Longer body text')
+        self.assertNotContains(response, 'Story body')
+
+    def test_listing_excerpts_are_stored_on_save(self):
+        story = self.add_story('First', body_text='Long &amp; <b>bold</b> ' + 'x' * 400)
+
+        self.assertEqual(
+            story.listing_excerpt,
+            '<p>Long &amp; <b>bold</b> ' + 'x' * 287 + '…</p>',
+        )
+        self.assertEqual(story.listing_excerpt_text, 'Long & bold ' + 'x' * 287 + '…')
+
+        story.excerpt = '<p>Short version</p>'
+        story.save_revision().publish()
+        story.refresh_from_db()
+        self.assertEqual(story.listing_excerpt, '<p>Short version</p>')
+        self.assertEqual(story.listing_excerpt_text, 'Short version')
+
+    def test_listing_leaves_bodies_deferred(self):
+        self.add_story('First', body_text='First body')
+
+        response = self.client.get('/news/')
+
+        self.assertContains(response, 'First body')
+        for story in response.context['page_obj']:
+            self.assertIn('body', story.get_deferred_fields())
+
+    def test_query_count_does_not_grow_with_stories(self):
+        self.add_story('First', body_text='First body')
+        self.add_story('Second', excerpt='<p>Second excerpt</p>')
+        self.get_index_queries()
+        queries = self.get_index_queries()
+
+        for i in range(3):
+            self.add_story(f'Story {i}', body_text=f'Body {i}')
+        self.get_index_queries()
+
+        self.assertEqual(self.get_index_queries(), queries)
+
+
+class NewsPaginationTestCase(NewsTestCase):
+    def setUp(self):
+        super().setUp()
+        # Seven published stories, five to a page.
+        for i in range(7):
+            self.add_story(f'Story {i}').save_revision().publish()
+
+    def get_titles(self, response):
+        return [story.title for story in response.context['page_obj']]
+
+    def test_pages_follow_cursors(self):
+        response = self.client.get('/news/')
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            self.get_titles(response), [f'Story {i}' for i in (6, 5, 4, 3, 2)]
+        )
+        self.assertEqual(page_obj.paginator.num_pages, 2)
+        self.assertIn('after=', page_obj.next_page_query())
+
+        response = self.client.get(f'/news/{page_obj.next_page_query()}')
+        page_obj = response.context['page_obj']
+        self.assertEqual(self.get_titles(response), ['Story 1', 'Story 0'])
+        self.assertEqual(page_obj.number, 2)
+        self.assertFalse(page_obj.has_next())
+
+        response = self.client.get(f'/news/{page_obj.previous_page_query()}')
+        self.assertEqual(
+            self.get_titles(response), [f'Story {i}' for i in (6, 5, 4, 3, 2)]
+        )
+
+    def test_page_numbers_still_work(self):
+        response = self.client.get('/news/', {'page': 2})
+        self.assertEqual(self.get_titles(response), ['Story 1', 'Story 0'])
+
+        response = self.client.get('/news/', {'page': 'nope'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_count_is_cached_until_news_is_published(self):
+        self.client.get('/news/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/news/')
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql'].upper()]
+        )
+
+        self.add_story('Story 7').save_revision().publish()
+
+        response = self.client.get('/news/')
+        self.assertEqual(response.context['page_obj'].paginator.count, 8)
+
+
+class NewsListingSettingsTestCase(NewsTestCase):
+    def test_settings_are_loaded_once_per_site(self):
+        request = RequestFactory().get('/')
+        prime_request(request)
+        news_settings = get_site_settings(find_site_for_request(request))[
+            NewsListingSettings
+        ]
+
+        with self.assertNumQueries(0):
+            request = RequestFactory().get('/')
+            self.assertIs(get_site_setting(NewsListingSettings, request), news_settings)
+            prime_request(request)
+            self.assertIs(NewsListingSettings.for_request(request), news_settings)
+
+    def test_settings_are_invalidated_on_save(self):
+        for i in range(3):
+            self.add_story(f'Story {i}')
+        news_settings = get_site_setting(NewsListingSettings, RequestFactory().get('/'))
+        news_settings.paginate_by = 2
+        news_settings.save()
+
+        response = self.client.get('/news/')
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+
+class NewsSectionTestCase(NewsTestCase):
+    def test_section_lists_latest_stories_without_bodies(self):
+        self.add_story('First')
+        self.add_story('Second')
+        self.add_story('Third')
+
+        block = SectionBlock()
+        value = block.to_python({'heading': 'News', 'page': self.news_index.pk, 'count': 2})
+        context = block.get_context(value)
+
+        self.assertEqual(
+            [story.title for story in context['section_pages']], ['Third', 'Second']
+        )
+        for story in context['section_pages']:
+            self.assertIn('body', story.get_deferred_fields())
+
+    def get_section_queries(self, *news_indexes):
+        block = SectionBlock()
+        values = [
+            block.to_python({'heading': 'News', 'page': news_index.pk, 'count': 3})
+            for news_index in news_indexes
+        ]
+        for value in values:
+            # Load the chosen page outside of the counted queries.
+            value['page']
+        with CaptureQueriesContext(connection) as queries:
+            prepare_sections(values)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_stories_or_sections(self):
+        for i in range(3):
+            self.add_story(f'Story {i}')
+        queries = self.get_section_queries(self.news_index)
+
+        for i in range(3, 10):
+            self.add_story(f'Story {i}')
+        events = NewsIndexPage(title='Events', slug='events')
+        self.news_index.get_parent().add_child(instance=events)
+        events.add_child(instance=NewsPage(title='Event', slug='event'))
+
+        self.assertEqual(self.get_section_queries(self.news_index, events), queries)
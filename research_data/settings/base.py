@@ -64,6 +64,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "wagtail.contrib.redirects.middleware.RedirectMiddleware",
+    "base.middleware.SiteMiddleware",
 ]
 
 ROOT_URLCONF = "research_data.urls"
@@ -81,7 +82,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
-                "wagtail.contrib.settings.context_processors.settings",
+                "base.context_processors.settings",
             ],
         },
     },
@@ -101,6 +102,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Generation counters used to invalidate cached navigation, sites, settings
+# and search results are kept here, so every process must share the same
+# cache: the web workers as well as the search index queue worker. Set
+# CACHE_LOCATION to keep it elsewhere, e.g. on a writable volume.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION", os.path.join(BASE_DIR, "cache")),
+        "OPTIONS": {
+            "MAX_ENTRIES": 5000,
+        },
+    }
+}
+
+# Tests use a cache of their own, see research_data/test_runner.py.
+TEST_RUNNER = "research_data.test_runner.TestRunner"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -175,9 +197,14 @@ WAGTAIL_SITE_NAME = "Research Data"
 
 # Search
 # https://docs.wagtail.org/en/stable/topics/search/backends.html
+# search.backends ranks SQLite FTS5 matches by relevance and matches
+# prefixes. Index updates are queued by the search app and applied in
+# batches by `./manage.py process_search_index_queue`, instead of
+# during requests.
 WAGTAILSEARCH_BACKENDS = {
     "default": {
-        "BACKEND": "wagtail.search.backends.database",
+        "BACKEND": "search.backends",
+        "AUTO_UPDATE": False,
     }
 }
 
@@ -0,0 +1,275 @@
+"""
+Search backend for the site's SQLite database.
+
+Wagtail's database backend already keeps its documents in an SQLite
+FTS5 table, but it hands matches back in the queryset's own order
+rather than by relevance, and only matches whole words. The backend
+here ranks matches with FTS5's bm25 function, weighting titles above
+body text, and treats the last word of a query as a prefix so that
+"stor" finds "storage".
+
+Use it with "BACKEND": "search.backends" in WAGTAILSEARCH_BACKENDS. On
+databases without FTS5 it falls back to Wagtail's database backend.
+"""
+
+from django.db.models import (
+    Case,
+    Exists,
+    FloatField,
+    Func,
+    IntegerField,
+    OuterRef,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+from wagtail.search.backends import get_search_backend
+from wagtail.search.backends.database import SearchBackend as DatabaseSearchBackend
+from wagtail.search.backends.database.sqlite.query import MatchExpression, normalize
+from wagtail.search.backends.database.sqlite.sqlite import (
+    SQLiteAutocompleteQueryCompiler,
+    SQLiteSearchBackend,
+    SQLiteSearchQueryCompiler,
+)
+from wagtail.search.models import SQLiteFTSIndexEntry
+from wagtail.search.query import MatchAll, Not
+from wagtail.search.utils import get_descendants_content_types_pks
+
+# Column weights for bm25, in the order of the columns of Wagtail's FTS5
+# table: autocomplete, body, title.
+FTS_COLUMN_WEIGHTS = (1.0, 1.0, 2.0)
+
+
+class WeightedBM25(Func):
+    """
+    bm25 score of the current FTS5 match. Lower scores are better.
+    """
+
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        weights = ', '.join(str(weight) for weight in FTS_COLUMN_WEIGHTS)
+        return f'bm25(wagtailsearch_indexentry_fts, {weights})', []
+
+
+class RankedSearchMixin:
+    LAST_TERM_IS_PREFIX = True
+
+    def get_matches(self, query, config=None):
+        """
+        Return the FTS5 entries matching a normalized query for objects in
+        the queryset. The queryset's own filters are checked for each
+        match by primary key, so SQLite starts from the FTS5 index.
+        """
+        search_query = self.build_search_query(query, config=config)
+        object_pk = Cast(
+            OuterRef('index_entry__object_id'), self.queryset.model._meta.pk
+        )
+        return SQLiteFTSIndexEntry.objects.filter(
+            MatchExpression(self.fields or self.FTS_TABLE_FIELDS, search_query),
+            Exists(self.queryset.filter(pk=object_pk)),
+            index_entry__content_type__in=get_descendants_content_types_pks(
+                self.queryset.model
+            ),
+        )
+
+    def get_ranked(self, matches, after=None, before=None):
+        """
+        Order matches best first by bm25 rank, then by index entry.
+
+        Args:
+            matches (obj): queryset from get_matches.
+            after (tuple or None): cursor of a match, to only keep the
+                matches ranked after it.
+            before (tuple or None): cursor of a match, to only keep the
+                matches ranked before it, in reverse order.
+
+        Returns:
+            A queryset of FTS5 entries with a search_rank.
+        """
+        ranked = matches.annotate(search_rank=WeightedBM25())
+        if after is not None:
+            rank, index_entry = after
+            return ranked.filter(
+                Q(search_rank__gt=rank)
+                | Q(search_rank=rank, index_entry__gt=index_entry)
+            ).order_by('search_rank', 'index_entry')
+        if before is not None:
+            rank, index_entry = before
+            return ranked.filter(
+                Q(search_rank__lt=rank)
+                | Q(search_rank=rank, index_entry__lt=index_entry)
+            ).order_by('-search_rank', '-index_entry')
+        return ranked.order_by('search_rank', 'index_entry')
+
+    def search_ranked(self, after=None, before=None, offset=0, limit=None):
+        """
+        Return a slice of the matches as (object pk, cursor) pairs, best
+        first. A cursor holds the bm25 rank and index entry id of a
+        match, so the next or previous slice can be found from it
+        without an OFFSET.
+        """
+        matches = self.get_matches(normalize(self.query))
+        ranked = self.get_ranked(matches, after=after, before=before)
+        if after is None and before is None:
+            stop = None if limit is None else offset + limit
+            ranked = ranked[offset:stop]
+        else:
+            ranked = ranked[:limit]
+
+        pk_field = self.queryset.model._meta.pk
+        results = [
+            (pk_field.to_python(object_id), (rank, index_entry))
+            for object_id, rank, index_entry in ranked.values_list(
+                'index_entry__object_id', 'search_rank', 'index_entry'
+            )
+        ]
+        if before is not None:
+            results.reverse()
+        return results
+
+    def search(self, config, start, stop, score_field=None):
+        normalized_query = normalize(self.query)
+        if not self.order_by_relevance or isinstance(normalized_query, (MatchAll, Not)):
+            return super().search(config, start, stop, score_field=score_field)
+
+        matches = self.get_matches(normalized_query, config=config)
+        if start is None and stop is None:
+            # Wagtail only needs a count.
+            object_pk = Cast('index_entry__object_id', self.queryset.model._meta.pk)
+            return self.queryset.filter(pk__in=matches.values(object_pk=object_pk))
+
+        ranked = self.get_ranked(matches).values_list(
+            'index_entry__object_id', 'search_rank'
+        )
+        if stop is None:
+            # Ordering the objects themselves by bm25 would make SQLite
+            # evaluate the match once per object, so rank the matches in
+            # one query, load the objects in another and put them in
+            # order here, rather than listing every match in the SQL.
+            to_python = self.queryset.model._meta.pk.to_python
+            ranks = {
+                to_python(object_id): (position, bm25)
+                for position, (object_id, bm25) in enumerate(ranked)
+            }
+            object_pk = Cast('index_entry__object_id', self.queryset.model._meta.pk)
+            objects = self.queryset.filter(
+                pk__in=matches.values(object_pk=object_pk)
+            ).order_by()
+            objects = sorted(
+                (obj for obj in objects if obj.pk in ranks),
+                key=lambda obj: ranks[obj.pk],
+            )
+            if score_field is not None:
+                for obj in objects:
+                    setattr(obj, score_field, -ranks[obj.pk][1])
+            return objects[start:]
+
+        # Match, filter, rank and slice in a single query, then load only
+        # the objects in the slice.
+        ranked = list(ranked[start:stop])
+        if not ranked:
+            return self.queryset.none()
+
+        position = Case(
+            *[
+                When(pk=object_id, then=Value(position))
+                for position, (object_id, bm25) in enumerate(ranked)
+            ],
+            output_field=IntegerField(),
+        )
+        queryset = (
+            self.queryset.filter(pk__in=[object_id for object_id, bm25 in ranked])
+            .annotate(search_rank=position)
+            .order_by('search_rank')
+        )
+        if score_field is not None:
+            # Higher scores are better, as with the other backends.
+            score = Case(
+                *[When(pk=object_id, then=Value(-bm25)) for object_id, bm25 in ranked],
+                output_field=FloatField(),
+            )
+            queryset = queryset.annotate(**{score_field: score})
+
+        return queryset
+
+
+class RankedSearchQueryCompiler(RankedSearchMixin, SQLiteSearchQueryCompiler):
+    pass
+
+
+class RankedAutocompleteQueryCompiler(
+    RankedSearchMixin, SQLiteAutocompleteQueryCompiler
+):
+    pass
+
+
+class FTS5SearchBackend(SQLiteSearchBackend):
+    query_compiler_class = RankedSearchQueryCompiler
+    autocomplete_query_compiler_class = RankedAutocompleteQueryCompiler
+
+    def search_ranked(
+        self, query, queryset, after=None, before=None, offset=0, limit=None
+    ):
+        """
+        Search a queryset and return a slice of the results as (object pk,
+        cursor) pairs, best first, for paging through them by cursor.
+
+        Args:
+            query (str): query string.
+            queryset (obj): queryset to search.
+            after (tuple or None): cursor of the result before the slice.
+            before (tuple or None): cursor of the result after the slice.
+            offset (int): start of the slice, without a cursor.
+            limit (int or None): maximum length of the slice.
+
+        Returns:
+            A list of (pk, cursor) pairs.
+        """
+        if not query:
+            return []
+        query_compiler = self.query_compiler_class(queryset, query)
+        query_compiler.check()
+        return query_compiler.search_ranked(
+            after=after, before=before, offset=offset, limit=limit
+        )
+
+
+def SearchBackend(params):
+    backend = DatabaseSearchBackend(params)
+    if isinstance(backend, SQLiteSearchBackend):
+        return FTS5SearchBackend(params)
+    return backend
+
+
+def search_ranked(queryset, query, after=None, before=None, offset=0, limit=None):
+    """
+    Search a queryset with the default search backend and return a slice
+    of the results as (pk, cursor) pairs, best first. With the FTS5
+    backend only the primary keys are loaded, not the objects.
+
+    The slice starts after or ends before the result with the given
+    cursor, or failing that at offset. Other backends cannot page by
+    cursor, so they return no cursors and always use the offset.
+
+    Args:
+        queryset (obj): queryset to search.
+        query (str or obj): query string or search query.
+        after (tuple or None): cursor of the result before the slice.
+        before (tuple or None): cursor of the result after the slice.
+        offset (int): start of the slice, without a cursor.
+        limit (int or None): maximum length of the slice.
+
+    Returns:
+        A list of (pk, cursor) pairs.
+    """
+    backend = get_search_backend()
+    if isinstance(backend, FTS5SearchBackend):
+        return backend.search_ranked(
+            query, queryset, after=after, before=before, offset=offset, limit=limit
+        )
+
+    stop = None if limit is None else offset + limit
+    results = backend.search(query, queryset)[offset:stop]
+    return [(obj.pk, None) for obj in results]
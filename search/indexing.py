@@ -0,0 +1,116 @@
+import logging
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from wagtail.search.backends import get_search_backends_with_name
+
+from base.cache import get_generation, increment_generation
+from search.models import IndexQueueEntry
+
+logger = logging.getLogger(__name__)
+
+REINDEX_CHUNK_SIZE = 200
+QUEUE_BATCH_SIZE = 1000
+QUEUE_DELETE_CHUNK_SIZE = 100
+
+# Moves on whenever documents in the search index change, so search
+# results can be cached against it.
+SEARCH_INDEX_GENERATION = 'search-index'
+
+
+def get_index_version():
+    return get_generation(SEARCH_INDEX_GENERATION)
+
+
+def _for_each_backend(model, update):
+    for backend_name, backend in get_search_backends_with_name():
+        try:
+            update(backend)
+        except Exception:
+            logger.exception(
+                "Exception raised while re-indexing %s objects in the '%s' search backend",
+                model.__name__,
+                backend_name,
+            )
+            if not backend.catch_indexing_errors:
+                raise
+
+
+def reindex(model, ids, chunk_size=REINDEX_CHUNK_SIZE):
+    """
+    Bring the search index documents of many objects of one model up to
+    date, loading and indexing them a chunk at a time with the backends'
+    bulk API rather than one object at a time. Objects that no longer
+    exist, or are no longer indexed, are removed from the index.
+
+    Args:
+        model (class): an indexed model, e.g. ServicePage.
+        ids (iterable): primary keys of the objects to re-index.
+        chunk_size (int): number of objects per bulk update.
+    """
+    ids = sorted({str(object_id) for object_id in ids})
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start : start + chunk_size]
+        objects = list(model.get_indexed_objects().filter(pk__in=chunk))
+        found = {str(obj.pk) for obj in objects}
+        removed = [model(pk=object_id) for object_id in chunk if object_id not in found]
+
+        if objects:
+            _for_each_backend(model, lambda backend: backend.add_bulk(model, objects))
+        for obj in removed:
+            _for_each_backend(model, lambda backend: backend.delete(obj))
+
+    if ids:
+        increment_generation(SEARCH_INDEX_GENERATION)
+
+
+def enqueue(model, ids):
+    """
+    Queue objects for re-indexing by the process_search_index_queue
+    management command.
+    """
+    IndexQueueEntry.objects.enqueue(model, ids)
+
+
+def process_queue(batch_size=QUEUE_BATCH_SIZE):
+    """
+    Re-index the objects waiting longest in the search index queue,
+    one bulk update per model, and take them off the queue.
+
+    Only the entries that were read are taken off, and only if they
+    have not been queued again since: an object saved while the batch
+    is being processed stays on the queue for the next batch, even if
+    its save started before the batch did.
+
+    Args:
+        batch_size (int): maximum number of queue entries to process.
+
+    Returns:
+        int, the number of queue entries processed.
+    """
+    entries = list(IndexQueueEntry.objects.order_by('queued_at')[:batch_size])
+
+    ids_by_content_type = defaultdict(list)
+    for entry in entries:
+        ids_by_content_type[entry.content_type_id].append(entry.object_id)
+
+    for content_type_id, ids in ids_by_content_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is not None:
+            reindex(model, ids)
+
+    # Delete in chunks to stay within SQLite's expression depth limit.
+    for start in range(0, len(entries), QUEUE_DELETE_CHUNK_SIZE):
+        chunk = entries[start : start + QUEUE_DELETE_CHUNK_SIZE]
+        IndexQueueEntry.objects.filter(
+            reduce(
+                operator.or_,
+                (Q(pk=entry.pk, queued_at=entry.queued_at) for entry in chunk),
+            )
+        ).delete()
+
+    return len(entries)
@@ -0,0 +1,52 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from search.indexing import QUEUE_BATCH_SIZE, process_queue
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Updates the search index for objects queued by saves and deletes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=QUEUE_BATCH_SIZE,
+            help='Maximum number of queued objects to re-index at a time.',
+        )
+        parser.add_argument(
+            '--forever',
+            action='store_true',
+            help='Keep waiting for new work instead of exiting when the queue is empty.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds to wait between checks of an empty queue, with --forever.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                processed = process_queue(options['batch_size'])
+            except Exception:
+                if not options['forever']:
+                    raise
+                # Keep going after errors such as a locked database. The
+                # batch is still queued, so it is retried after a pause.
+                logger.exception('Error while processing the search index queue')
+                close_old_connections()
+                processed = 0
+
+            if processed:
+                self.stdout.write(f'Re-indexed {processed} queued objects.')
+                continue
+            if not options['forever']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,70 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.utils import timezone
+from wagtail.models import Page
+
+
+class IndexQueueEntryManager(models.Manager):
+    def enqueue(self, model, ids):
+        """
+        Queue objects for a search index update. Queuing an object that
+        is already waiting only moves its queued_at forward, so bursts
+        of saves coalesce into a single update.
+
+        Args:
+            model (class): model of the objects.
+            ids (iterable): primary keys of the objects.
+        """
+        content_type = ContentType.objects.get_for_model(model)
+        queued_at = timezone.now()
+        self.bulk_create(
+            [
+                IndexQueueEntry(
+                    content_type=content_type,
+                    object_id=str(object_id),
+                    queued_at=queued_at,
+                )
+                for object_id in ids
+            ],
+            update_conflicts=True,
+            unique_fields=['content_type', 'object_id'],
+            update_fields=['queued_at'],
+        )
+
+    def enqueue_object(self, instance):
+        """
+        Queue a single saved or deleted object. Pages are queued under
+        their specific type, which is the one the search index uses.
+        """
+        model = type(instance)
+        if isinstance(instance, Page) and instance.content_type_id:
+            content_type = ContentType.objects.get_for_id(instance.content_type_id)
+            model = content_type.model_class() or model
+        self.enqueue(model, [instance.pk])
+
+
+class IndexQueueEntry(models.Model):
+    """
+    An object whose search index document needs updating, either
+    because it was saved or because it was deleted. The queue is worked
+    through by the process_search_index_queue management command.
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=255)
+    queued_at = models.DateTimeField(db_index=True)
+
+    objects = IndexQueueEntryManager()
+
+    class Meta:
+        verbose_name = 'Search Index Queue Entry'
+        verbose_name_plural = 'Search Index Queue Entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_type', 'object_id'],
+                name='unique_search_index_queue_entry',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type} {self.object_id}'
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from wagtail.search import index
+
+from search.models import IndexQueueEntry
+
+
+def indexed_object_changed(sender, instance, **kwargs):
+    """
+    Queue saved and deleted objects for re-indexing in the same
+    transaction, rather than updating the index during the request.
+    """
+    IndexQueueEntry.objects.enqueue_object(instance)
+
+
+for model in index.get_indexed_models():
+    if getattr(model, 'search_auto_update', True):
+        post_save.connect(indexed_object_changed, sender=model)
+        post_delete.connect(indexed_object_changed, sender=model)
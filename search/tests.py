@@ -0,0 +1,252 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from wagtail.models import Page
+from wagtail.search.backends import get_search_backend
+
+from base.models import StandardPage
+from news.models import NewsPage
+from search.backends import FTS5SearchBackend
+from search.indexing import process_queue
+from search.models import IndexQueueEntry
+from search.views import load_results
+
+
+class IndexQueueTestCase(TestCase):
+    def setUp(self):
+        process_queue()
+        self.home = Page.objects.get(depth=2)
+
+    def add_page(self, title):
+        page = StandardPage(title=title, slug=title.lower())
+        self.home.add_child(instance=page)
+        return page
+
+    def search(self, query):
+        return [page.pk for page in Page.objects.live().search(query)]
+
+    def test_saves_are_queued_and_coalesced(self):
+        page = self.add_page('Notebook')
+        page.title = 'Notebooks'
+        page.save()
+        page.save_revision().publish()
+
+        entries = IndexQueueEntry.objects.filter(object_id=str(page.pk))
+        self.assertEqual(
+            [entry.content_type.model_class() for entry in entries], [StandardPage]
+        )
+        self.assertEqual(self.search('notebooks'), [])
+
+    def test_queue_updates_the_index(self):
+        page = self.add_page('Notebook')
+
+        self.assertEqual(process_queue(), 1)
+        self.assertEqual(self.search('notebook'), [page.pk])
+        self.assertFalse(IndexQueueEntry.objects.exists())
+
+        page.delete()
+        process_queue()
+
+        self.assertEqual(self.search('notebook'), [])
+
+    def test_entries_queued_again_during_a_batch_stay_queued(self):
+        page = self.add_page('Notebook')
+        entry = IndexQueueEntry.objects.get()
+
+        def requeue(model, ids):
+            # A save that started before the batch but committed during
+            # it, so its queued_at is older than the batch.
+            IndexQueueEntry.objects.filter(pk=entry.pk).update(
+                queued_at=entry.queued_at - timedelta(seconds=1)
+            )
+
+        with patch('search.indexing.reindex', side_effect=requeue):
+            process_queue()
+
+        self.assertTrue(IndexQueueEntry.objects.filter(object_id=str(page.pk)).exists())
+
+    def test_worker_keeps_running_after_errors(self):
+        command = 'search.management.commands.process_search_index_queue'
+        stdout = StringIO()
+        batches = [OperationalError('database is locked'), 2, KeyboardInterrupt]
+
+        with (
+            patch(f'{command}.process_queue', side_effect=batches),
+            patch(f'{command}.time.sleep') as sleep,
+            self.assertLogs(command, 'ERROR'),
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            call_command('process_search_index_queue', forever=True, stdout=stdout)
+
+        sleep.assert_called_once()
+        self.assertIn('Re-indexed 2 queued objects.', stdout.getvalue())
+
+
+class FTS5SearchBackendTestCase(TestCase):
+    def setUp(self):
+        home = Page.objects.get(depth=2)
+        self.pages = {}
+        for title, body in [
+            ('Archives', 'Long term storage of research data.'),
+            ('Storage', 'Where to keep files.'),
+            ('Computing', 'Clusters for analysis.'),
+        ]:
+            page = StandardPage(
+                title=title, slug=title.lower(), body=[('paragraph', f'<p>{body}</p>')]
+            )
+            home.add_child(instance=page)
+            self.pages[title] = page
+        process_queue()
+
+    def search(self, query):
+        return [page.title for page in Page.objects.live().search(query)]
+
+    def test_backend_uses_fts5(self):
+        self.assertIsInstance(get_search_backend(), FTS5SearchBackend)
+
+    def test_results_are_ranked_by_relevance(self):
+        self.assertEqual(self.search('storage'), ['Storage', 'Archives'])
+
+    def test_last_term_matches_prefixes(self):
+        self.assertEqual(self.search('comput'), ['Computing'])
+        self.assertEqual(self.search('research stor'), ['Archives'])
+
+    def test_a_slice_of_results_is_ranked_in_one_query(self):
+        results = Page.objects.live().exclude(title='Archives').search('storage')
+        # Warm up the content type cache.
+        self.search('storage')
+
+        # One query to match, filter, rank and slice, one to load the slice.
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual([page.title for page in results[:5]], ['Storage'])
+
+        ranked, loaded = [query['sql'] for query in queries.captured_queries]
+        for part in ['MATCH', '"title" = \'Archives\'', 'bm25', 'LIMIT 5']:
+            self.assertIn(part, ranked)
+        self.assertNotIn('MATCH', loaded)
+
+    def test_unsliced_results_are_ranked_without_listing_them_in_sql(self):
+        results = Page.objects.live().exclude(title='Computing').search('storage')
+        # Warm up the content type cache.
+        self.search('storage')
+
+        # One query to rank the matches, one to load them.
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual([page.title for page in results], ['Storage', 'Archives'])
+
+        ranked, loaded = [query['sql'] for query in queries.captured_queries]
+        self.assertIn('bm25', ranked)
+        # The objects are loaded by the match, not by a list of ids.
+        self.assertIn('MATCH', loaded)
+        self.assertNotIn('CASE', loaded)
+
+    def test_scores_are_annotated_best_first(self):
+        results = Page.objects.live().search('storage').annotate_score('score')
+
+        scores = [page.score for page in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+
+class SearchViewTestCase(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(depth=2)
+        for number in range(12):
+            self.home.add_child(
+                instance=StandardPage(title=f'Data {number}', slug=f'data-{number}')
+            )
+        process_queue()
+
+    def test_results_are_paginated_from_cached_ids(self):
+        response = self.client.get('/search/', {'query': 'data'})
+        self.assertEqual(len(response.context['search_results']), 10)
+        self.assertEqual(response.context['search_results'].total, 12)
+        self.assertContains(response, '12 results')
+
+        with patch('search.views.search_pages') as search_pages:
+            response = self.client.get('/search/', {'query': '  DATA ', 'page': 2})
+        search_pages.assert_not_called()
+        self.assertEqual(len(response.context['search_results']), 2)
+
+    def test_cached_ids_are_invalidated_when_the_index_changes(self):
+        self.client.get('/search/', {'query': 'data'})
+
+        self.home.add_child(instance=StandardPage(title='Data 12', slug='data-12'))
+        process_queue()
+
+        response = self.client.get('/search/', {'query': 'data'})
+        self.assertEqual(response.context['search_results'].total, 13)
+
+    def test_out_of_range_pages_show_the_last_page(self):
+        response = self.client.get('/search/', {'query': 'data', 'page': 9})
+
+        self.assertEqual(response.context['search_results'].number, 2)
+
+    @patch('search.views.SEARCH_RESULTS_LIMIT', 5)
+    def test_pages_past_the_cached_ids_are_fetched_without_a_count(self):
+        response = self.client.get('/search/', {'query': 'data', 'page': 2})
+        search_results = response.context['search_results']
+        self.assertEqual(len(search_results), 2)
+        self.assertFalse(search_results.has_next())
+        self.assertTrue(search_results.total_is_capped)
+        self.assertContains(response, '5+ results')
+
+        response = self.client.get('/search/', {'query': 'data', 'page': 1})
+        self.assertTrue(response.context['search_results'].has_next())
+
+    @patch('search.views.SEARCH_RESULTS_LIMIT', 5)
+    def test_pages_past_the_cached_ids_are_found_by_cursor(self):
+        all_titles = [page.title for page in Page.objects.live().search('data')]
+
+        response = self.client.get('/search/', {'query': 'data'})
+        titles = [result.title for result in response.context['search_results']]
+        next_query = response.context['search_results'].next_page_query()
+        self.assertIn('after=', next_query)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/search/?query=data&{next_query}')
+        self.assertNotIn(
+            'OFFSET', ' '.join(query['sql'] for query in queries.captured_queries)
+        )
+        search_results = response.context['search_results']
+        titles += [result.title for result in search_results]
+        self.assertEqual(search_results.number, 2)
+        self.assertFalse(search_results.has_next())
+        self.assertEqual(titles, all_titles)
+
+        previous_query = search_results.previous_page_query()
+        self.assertIn('before=', previous_query)
+        response = self.client.get(f'/search/?query=data&{previous_query}')
+        self.assertEqual(
+            [result.title for result in response.context['search_results']],
+            all_titles[:10],
+        )
+
+    def test_results_are_loaded_as_specific_pages_in_order(self):
+        story = self.home.add_child(instance=NewsPage(title='Data news', slug='news'))
+        pages = list(StandardPage.objects.order_by('-pk')[:3])
+        page_ids = [pages[0].pk, story.pk, pages[1].pk, pages[2].pk]
+        request = self.client.get('/').wsgi_request
+
+        # One query for the pages, then one per page type.
+        with self.assertNumQueries(3):
+            results = load_results(page_ids, request)
+            urls = [result.result_url for result in results]
+
+        self.assertEqual([result.pk for result in results], page_ids)
+        self.assertIsInstance(results[1], NewsPage)
+        self.assertEqual(urls[1], '/news/')
+
+    def test_unpublished_pages_are_left_out_of_cached_results(self):
+        self.client.get('/search/', {'query': 'data'})
+        StandardPage.objects.get(slug='data-0').unpublish()
+
+        response = self.client.get('/search/', {'query': 'data'})
+
+        titles = [result.title for result in response.context['search_results']]
+        self.assertNotIn('Data 0', titles)
+        self.assertEqual(len(titles), 9)
@@ -1,8 +1,17 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+import hashlib
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
 from django.template.response import TemplateResponse
 
 from wagtail.models import Page
 
+from base.sites import find_site_for_request
+from search.backends import search_ranked
+from search.indexing import get_index_version
+
 # To enable logging of search queries for use with the "Promoted search results" module
 # <https://docs.wagtail.org/en/stable/reference/contrib/searchpromotions.html>
 # uncomment the following line and the lines indicated in the search function
@@ -10,14 +19,255 @@ from wagtail.models import Page
 
 # from wagtail.contrib.search_promotions.models import Query
 
+SEARCH_RESULTS_CACHE_TIMEOUT = 60 * 5
+# This many of the best matches are cached. Pages beyond them are
+# fetched from the search backend directly, by cursor.
+SEARCH_RESULTS_LIMIT = 500
+SEARCH_RESULTS_PER_PAGE = 10
+
+
+class SearchResultsPage:
+    """
+    One page of search results. Unlike a Django paginator page it only
+    knows the total number of results when that is cheap to find out,
+    otherwise total is a lower bound and total_is_capped is True.
+
+    Links to the neighbouring pages carry the cursors of the results at
+    either end, so pages past the cached results are found without an
+    OFFSET.
+    """
+
+    def __init__(
+        self,
+        object_list,
+        number,
+        has_next,
+        total,
+        total_is_capped=False,
+        cursors=(None, None),
+    ):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        self.total = total
+        self.total_is_capped = total_is_capped
+        self.first_cursor, self.last_cursor = cursors
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def _page_query(self, number, direction, cursor):
+        params = {'page': number}
+        if cursor is not None:
+            params[direction] = encode_cursor(cursor)
+        return urlencode(params)
+
+    def next_page_query(self):
+        return self._page_query(self.number + 1, 'after', self.last_cursor)
+
+    def previous_page_query(self):
+        return self._page_query(self.number - 1, 'before', self.first_cursor)
+
+
+def encode_cursor(cursor):
+    rank, index_entry = cursor
+    return f'{rank!r}_{index_entry}'
+
+
+def decode_cursor(cursor):
+    """
+    Return the rank and index entry id in a cursor, or None when it is
+    not a valid one.
+    """
+    try:
+        rank, index_entry = cursor.rsplit('_', 1)
+        return float(rank), int(index_entry)
+    except (AttributeError, ValueError):
+        return None
+
+
+def normalize_query(search_query):
+    """
+    Collapse whitespace and case, which the search backend ignores
+    anyway, so that equivalent queries share cached results.
+    """
+    return ' '.join(search_query.lower().split())
+
+
+def get_results(search_query, site):
+    """
+    Return the best matches for a normalized query among the live pages
+    of a site, up to SEARCH_RESULTS_LIMIT of them, as (page id, cursor)
+    pairs.
+
+    Results are cached for a few minutes, and until the search index
+    changes, so paging through them does not run the search again.
+
+    Args:
+        search_query (str): normalized query.
+        site (obj or None): the site to search, or None for all sites.
+
+    Returns:
+        A list of (page id, cursor) pairs.
+    """
+    query_hash = hashlib.sha256(search_query.encode()).hexdigest()
+    site_id = site.pk if site else None
+    key = f'search:results:{site_id}:{get_index_version()}:{query_hash}'
+    results = cache.get(key)
+    if results is None:
+        results = search_pages(search_query, site, limit=SEARCH_RESULTS_LIMIT)
+        cache.set(key, results, SEARCH_RESULTS_CACHE_TIMEOUT)
+    return results
+
+
+def search_pages(search_query, site, after=None, before=None, offset=0, limit=None):
+    """
+    Run the search among the live pages of a site and return a slice of
+    the results as (page id, cursor) pairs, best first. See
+    search.backends.search_ranked.
+    """
+    pages = Page.objects.live()
+    if site is not None:
+        pages = pages.in_site(site)
+    return search_ranked(
+        pages, search_query, after=after, before=before, offset=offset, limit=limit
+    )
+
+
+def get_results_page(
+    search_query,
+    site,
+    number,
+    per_page=SEARCH_RESULTS_PER_PAGE,
+    after=None,
+    before=None,
+):
+    """
+    Find one page of results without counting every match.
+
+    Pages within the cached results are sliced from them. Further pages
+    start after or end before the cursor passed in from a neighbouring
+    page, and ask the backend for one result more than a page to find
+    out whether there is a next page.
+
+    Args:
+        search_query (str): normalized query.
+        site (obj or None): the site to search.
+        number (int): page number, from 1.
+        per_page (int): results per page.
+        after (tuple or None): cursor of the last result of the
+            previous page.
+        before (tuple or None): cursor of the first result of the
+            next page.
+
+    Returns:
+        A SearchResultsPage of page ids.
+    """
+    results = get_results(search_query, site)
+    is_capped = len(results) >= SEARCH_RESULTS_LIMIT
+
+    start = (number - 1) * per_page
+    if not is_capped and start >= len(results):
+        # Past the end, show the last page instead.
+        number = max(1, -(-len(results) // per_page))
+        start = (number - 1) * per_page
+
+    stop = start + per_page
+    if stop < len(results) or not is_capped:
+        has_next = stop < len(results)
+        page_results = results[start:stop]
+    elif before is not None:
+        has_next = True
+        page_results = search_pages(search_query, site, before=before, limit=per_page)
+    else:
+        page_results = search_pages(
+            search_query, site, after=after, offset=start, limit=per_page + 1
+        )
+        has_next = len(page_results) > per_page
+        page_results = page_results[:per_page]
+
+    cursors = (None, None)
+    if page_results:
+        cursors = (page_results[0][1], page_results[-1][1])
+    return SearchResultsPage(
+        [page_id for page_id, cursor in page_results],
+        number,
+        has_next,
+        len(results),
+        is_capped,
+        cursors,
+    )
+
+
+def load_results(page_ids, request):
+    """
+    Load the specific pages for a page of results, with one query per
+    page type rather than one per result.
+
+    Only live pages of the request's site are loaded, as result ids can
+    be cached for a while after a page is unpublished. StreamFields are
+    deferred, thumbnails come with their renditions, and every page gets
+    its URL worked out up front as result_url.
+
+    Args:
+        page_ids (list): page ids, in the order to show them.
+        request (obj): request object, used for URL generation.
+
+    Returns:
+        A list of specific pages.
+    """
+    pages = Page.objects.live().filter(pk__in=page_ids)
+    site = find_site_for_request(request)
+    if site is not None:
+        pages = pages.in_site(site)
+    pages = {page.pk: page for page in pages.specific().defer_streamfields()}
+    results = [pages[page_id] for page_id in page_ids if page_id in pages]
+
+    pages_by_model = defaultdict(list)
+    for page in results:
+        pages_by_model[type(page)].append(page)
+    for model, model_pages in pages_by_model.items():
+        if hasattr(model, 'thumbnail'):
+            prefetch_related_objects(model_pages, 'thumbnail__renditions')
+
+    for page in results:
+        page.result_url = page.get_url(request)
+
+    return results
+
 
 def search(request):
     search_query = request.GET.get("query", None)
-    page = request.GET.get("page", 1)
+    try:
+        page = max(1, int(request.GET.get("page", 1)))
+    except ValueError:
+        page = 1
 
     # Search
     if search_query:
-        search_results = Page.objects.live().search(search_query)
+        site = find_site_for_request(request)
+        search_results = get_results_page(
+            normalize_query(search_query),
+            site,
+            page,
+            after=decode_cursor(request.GET.get("after")),
+            before=decode_cursor(request.GET.get("before")),
+        )
 
         # To log this query for use with the "Promoted search results" module:
 
@@ -25,16 +275,9 @@ def search(request):
         # query.add_hit()
 
     else:
-        search_results = Page.objects.none()
+        search_results = SearchResultsPage([], 1, False, 0)
 
-    # Pagination
-    paginator = Paginator(search_results, 10)
-    try:
-        search_results = paginator.page(page)
-    except PageNotAnInteger:
-        search_results = paginator.page(1)
-    except EmptyPage:
-        search_results = paginator.page(paginator.num_pages)
+    search_results.object_list = load_results(search_results.object_list, request)
 
     return TemplateResponse(
         request,
@@ -0,0 +1,392 @@
+from bisect import bisect_left
+
+from django.db import transaction
+from wagtail.models import Page
+
+from base.cache import get_generation, increment_generation
+from services.models import (
+    Division,
+    FunderPolicy,
+    ResearchLifecyclePhase,
+    ResearchLifecyclePhaseAddition,
+    ServiceCategory,
+    ServiceCategoryAddition,
+    ServicePage,
+    ServicePageDivisionAddition,
+    ServicePageFunderPolicyAddition,
+)
+
+SERVICES_GENERATION = 'services'
+
+# Facet name: (through model, foreign key to the snippet, snippet model).
+FACETS = {
+    'phase': (ResearchLifecyclePhaseAddition, 'phase', ResearchLifecyclePhase),
+    'category': (ServiceCategoryAddition, 'category', ServiceCategory),
+    'division': (ServicePageDivisionAddition, 'division', Division),
+    'funder': (ServicePageFunderPolicyAddition, 'funder_policy', FunderPolicy),
+}
+
+
+class ServiceRecord:
+    """
+    The few fields of a live ServicePage that listings need.
+    """
+
+    __slots__ = ('id', 'path', 'url_path', 'title', 'position')
+
+    def __init__(self, id, path, url_path, title, position):
+        self.id = id
+        self.path = path
+        self.url_path = url_path
+        self.title = title
+        self.position = position
+
+
+class SnippetRecord:
+    __slots__ = ('id', 'slug', 'name')
+
+    def __init__(self, id, slug, name):
+        self.id = id
+        self.slug = slug
+        self.name = name
+
+
+class Suggestion:
+    """
+    A service or facet value offered while someone types a search.
+    facet is None for services.
+    """
+
+    __slots__ = ('facet', 'id', 'label')
+
+    def __init__(self, facet, id, label):
+        self.facet = facet
+        self.id = id
+        self.label = label
+
+
+class ServiceIndex:
+    """
+    In-memory facet index of live services.
+
+    Every service gets a bit position, and every facet value (a phase,
+    category, division or funder policy) and every parent page keeps an
+    integer bitset of the services it applies to. Filtering is then a
+    matter of and-ing bitsets together.
+    """
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.records = []
+        self.positions = {}
+        self.live = 0
+        self.parents = {}
+        self.bits = {facet: {} for facet in FACETS}
+        self.snippets = {facet: {} for facet in FACETS}
+        self.slugs = {facet: {} for facet in FACETS}
+        self._suggestions = None
+
+    @classmethod
+    def build(cls, generation):
+        index = cls(generation)
+        for page in ServicePage.objects.live().order_by('path').only(
+            'id', 'path', 'url_path', 'title'
+        ):
+            index._add_record(page)
+
+        for facet, (through, field_name, snippet_model) in FACETS.items():
+            for snippet in snippet_model.objects.only('id', 'slug', 'name'):
+                index._add_snippet(facet, snippet)
+            for page_id, snippet_id in through.objects.values_list(
+                'page_id', f'{field_name}_id'
+            ):
+                index._add_value(facet, page_id, snippet_id)
+
+        return index
+
+    def _add_record(self, page):
+        position = self.positions.get(page.id)
+        if position is None:
+            position = len(self.records)
+            self.records.append(None)
+            self.positions[page.id] = position
+        self.records[position] = ServiceRecord(
+            page.id, page.path, page.url_path, page.title, position
+        )
+        self.live |= 1 << position
+        self._suggestions = None
+
+        parent_path = page.path[: -Page.steplen]
+        self.parents[parent_path] = self.parents.get(parent_path, 0) | 1 << position
+
+    def _add_snippet(self, facet, snippet):
+        previous = self.snippets[facet].get(snippet.id)
+        if previous is not None:
+            self.slugs[facet].pop(previous.slug, None)
+        self.snippets[facet][snippet.id] = SnippetRecord(
+            snippet.id, snippet.slug, snippet.name
+        )
+        self.slugs[facet][snippet.slug] = snippet.id
+        self._suggestions = None
+
+    def _add_value(self, facet, page_id, snippet_id):
+        position = self.positions.get(page_id)
+        if position is not None:
+            values = self.bits[facet]
+            values[snippet_id] = values.get(snippet_id, 0) | 1 << position
+
+    def _remove_record(self, page_id):
+        position = self.positions.get(page_id)
+        if position is None:
+            return
+        mask = ~(1 << position)
+        self.live &= mask
+        self.parents = {path: bits & mask for path, bits in self.parents.items()}
+        self.bits = {
+            facet: {value: bits & mask for value, bits in values.items()}
+            for facet, values in self.bits.items()
+        }
+        self.records[position] = None
+        self._suggestions = None
+
+    def update_page(self, page_id):
+        """
+        Bring a single service up to date with the database.
+        """
+        self._remove_record(page_id)
+        page = (
+            ServicePage.objects.live()
+            .filter(id=page_id)
+            .only('id', 'path', 'url_path', 'title')
+            .first()
+        )
+        if page is None:
+            return
+
+        self._add_record(page)
+        for facet, (through, field_name, snippet_model) in FACETS.items():
+            for snippet_id in through.objects.filter(page_id=page_id).values_list(
+                f'{field_name}_id', flat=True
+            ):
+                self._add_value(facet, page_id, snippet_id)
+
+    def update_snippet(self, facet, snippet):
+        self._add_snippet(facet, snippet)
+
+    def get_name(self, facet, slug):
+        """
+        Return the name of the facet value with the given slug, or None.
+        """
+        snippet_id = self.slugs[facet].get(slug)
+        if snippet_id is None:
+            return None
+        return self.snippets[facet][snippet_id].name
+
+    def bits_for_ids(self, ids):
+        """
+        Return the bitset of the given page ids.
+        """
+        bits = 0
+        for page_id in ids:
+            position = self.positions.get(page_id)
+            if position is not None:
+                bits |= 1 << position
+        return bits
+
+    def _facet_mask(self, facet, slugs):
+        mask = 0
+        for slug in slugs:
+            mask |= self.bits[facet].get(self.slugs[facet].get(slug), 0)
+        return mask
+
+    def search(self, parent=None, filters=None, restrict=None):
+        """
+        Match services against several facets at once, and count how
+        many services each facet value would match.
+
+        Values of the same facet are or-ed together, and different facets
+        are and-ed. The count for a facet value is worked out against the
+        other selected facets only, so it is the number of results that
+        choosing that value would give.
+
+        Args:
+            parent (obj or None): only include children of this page.
+            filters (dict or None): facet names mapped to lists of slugs.
+            restrict (int or None): bitset the results must fall within,
+                e.g. the matches of a text search.
+
+        Returns:
+            A tuple of the matching bitset, and a dictionary mapping
+            facet names to dictionaries of slugs and counts.
+        """
+        if parent is None:
+            base = self.live
+        else:
+            base = self.parents.get(parent.path, 0)
+        if restrict is not None:
+            base &= restrict
+
+        masks = {
+            facet: self._facet_mask(facet, slugs)
+            for facet, slugs in (filters or {}).items()
+            if slugs
+        }
+
+        bits = base
+        for mask in masks.values():
+            bits &= mask
+
+        counts = {}
+        for facet, values in self.bits.items():
+            others = base
+            for other_facet, mask in masks.items():
+                if other_facet != facet:
+                    others &= mask
+            snippets = self.snippets[facet]
+            counts[facet] = {
+                snippets[snippet_id].slug: (others & value_bits).bit_count()
+                for snippet_id, value_bits in values.items()
+                if snippet_id in snippets
+            }
+
+        return bits, counts
+
+    def get_ids(self, bits, order=None):
+        """
+        Return the page ids in a bitset, in page tree order or in the
+        order of the given list of ids.
+        """
+        if order is not None:
+            return [
+                page_id
+                for page_id in order
+                if page_id in self.positions and bits >> self.positions[page_id] & 1
+            ]
+
+        records = [
+            record
+            for record in self.records
+            if record is not None and bits >> record.position & 1
+        ]
+        records.sort(key=lambda record: record.path)
+        return [record.id for record in records]
+
+    def _build_suggestions(self):
+        """
+        Build a sorted array of the lower-cased titles of live services
+        and names of facet values in use, starting from each word, so
+        that a bisect finds every name with a word that starts with a
+        prefix.
+        """
+        suggestions = [
+            Suggestion(None, record.id, record.title)
+            for record in self.records
+            if record is not None
+        ]
+        for facet, snippets in self.snippets.items():
+            for snippet in snippets.values():
+                if self.bits[facet].get(snippet.id, 0) & self.live:
+                    suggestions.append(Suggestion(facet, snippet.id, snippet.name))
+
+        entries = []
+        for suggestion in suggestions:
+            words = suggestion.label.lower().split()
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), start, suggestion))
+        entries.sort(key=lambda entry: entry[0])
+
+        keys = [entry[0] for entry in entries]
+        return keys, entries
+
+    def suggest(self, prefix, limit=10):
+        """
+        Return services and facet values with a word starting with a
+        prefix, names that start with it first.
+
+        Args:
+            prefix (str): text typed so far.
+            limit (int): maximum number of suggestions.
+
+        Returns:
+            A list of Suggestion objects.
+        """
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        if self._suggestions is None:
+            self._suggestions = self._build_suggestions()
+        keys, entries = self._suggestions
+
+        matches = {}
+        for position in range(bisect_left(keys, prefix), len(keys)):
+            if not keys[position].startswith(prefix):
+                break
+            key, start, suggestion = entries[position]
+            rank = (start > 0, suggestion.label.lower())
+            if suggestion not in matches or rank < matches[suggestion]:
+                matches[suggestion] = rank
+
+        return sorted(matches, key=matches.get)[:limit]
+
+    def filter(self, parent=None, **filters):
+        """
+        Return the ids of services below a parent page that match every
+        given facet value, e.g. filter(page, phase='analyze').
+        """
+        bits, counts = self.search(
+            parent, {facet: [slug] for facet, slug in filters.items()}
+        )
+        return self.get_ids(bits)
+
+
+_index = None
+
+
+def get_service_index():
+    """
+    Return the facet index for this process, building it if the services
+    generation has moved on since it was built.
+    """
+    global _index
+
+    generation = get_generation(SERVICES_GENERATION)
+    index = _index
+    if index is None or index.generation != generation:
+        index = _index = ServiceIndex.build(generation)
+    return index
+
+
+def _apply_on_commit(update):
+    """
+    Once the current transaction commits, move the services generation
+    on and apply update to this process's index. If another process
+    changed services in the meantime, the index is rebuilt instead.
+    """
+
+    def apply():
+        generation = increment_generation(SERVICES_GENERATION)
+        index = _index
+        if index is not None and index.generation == generation - 1:
+            update(index)
+            index.generation = generation
+
+    transaction.on_commit(apply)
+
+
+def service_changed(page_id):
+    _apply_on_commit(lambda index: index.update_page(page_id))
+
+
+def snippet_changed(facet, snippet):
+    _apply_on_commit(lambda index: index.update_snippet(facet, snippet))
+
+
+def services_changed():
+    """
+    Invalidate the index in every process, e.g. after a snippet is
+    deleted and its additions cascade away.
+    """
+    global _index
+
+    _index = None
+    _apply_on_commit(lambda index: None)
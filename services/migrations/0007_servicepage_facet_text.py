@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:46
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+FACET_RELATIONS = [
+    ("ResearchLifecyclePhaseAddition", "phase"),
+    ("ServiceCategoryAddition", "category"),
+    ("ServicePageDivisionAddition", "division"),
+    ("ServicePageFunderPolicyAddition", "funder_policy"),
+]
+
+
+def populate_facet_text(apps, schema_editor):
+    ServicePage = apps.get_model("services", "ServicePage")
+
+    names = defaultdict(list)
+    for model_name, field_name in FACET_RELATIONS:
+        through = apps.get_model("services", model_name)
+        for page_id, name in through.objects.order_by(
+            "page_id", "sort_order"
+        ).values_list("page_id", f"{field_name}__name"):
+            names[page_id].append(name)
+
+    services = list(ServicePage.objects.only("pk"))
+    for service in services:
+        service.facet_text = "\n".join(names[service.pk])
+    ServicePage.objects.bulk_update(services, ["facet_text"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0006_phasemenu"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="servicepage",
+            name="facet_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(populate_facet_text, migrations.RunPython.noop),
+    ]
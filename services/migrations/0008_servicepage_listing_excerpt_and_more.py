@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0007_servicepage_facet_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicepage',
+            name='listing_excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='servicepage',
+            name='listing_excerpt_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceslistingpage',
+            name='listing_excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceslistingpage',
+            name='listing_excerpt_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
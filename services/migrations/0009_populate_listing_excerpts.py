@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from base.listings import populate_listing_excerpts
+
+
+def populate(apps, schema_editor):
+    for model_name in ["ServicePage", "ServicesListingPage"]:
+        populate_listing_excerpts(apps.get_model("services", model_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0008_servicepage_listing_excerpt_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,15 @@
+from collections import defaultdict
+
 from base.models import AbstractBasePage
 from django.db import models
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import QueryDict
 from django.utils.text import slugify
 from modelcluster.fields import ParentalKey
+from search.backends import search_ranked
 from wagtail.admin.panels import FieldPanel, InlinePanel
 from wagtail.contrib.routable_page.models import RoutablePageMixin, path
-from wagtail.models import Orderable
+from wagtail.models import Orderable, Page
 from wagtail.search import index
 from wagtail.search.utils import parse_query_string
 from wagtail.snippets.models import register_snippet
@@ -218,38 +223,35 @@ class ServicePage(AbstractBasePage):
         InlinePanel('funder_policy_additions', label='Funder Policies'),
     ]
 
-    def get_related_lifecycle_phases(self):
-        return '\n'.join(
-            self.research_lifecycle_phase_additions.all().values_list(
-                'phase__name', flat=True
-            )
-        )
+    # Names of the page's phases, categories, divisions and funder
+    # policies, kept up to date on save so that indexing a service never
+    # has to query its relations.
+    facet_text = models.TextField(blank=True, editable=False)
 
-    def get_related_divisions(self):
-        return '\n'.join(
-            self.division_additions.all().values_list('division__name', flat=True)
-        )
+    search_fields = AbstractBasePage.search_fields + [
+        index.SearchField('facet_text'),
+    ]
 
-    def get_related_funder_policies(self):
-        return '\n'.join(
-            self.funder_policy_additions.all().values_list(
-                'funder_policy__name', flat=True
-            )
-        )
+    def get_facet_text(self):
+        """
+        Build the text indexed for the page's facets from its relations,
+        which may still only be held in memory.
 
-    def get_related_categories(self):
-        return '\n'.join(
-            self.service_category_additions.all().values_list(
-                'category__name', flat=True
-            )
-        )
+        Returns:
+            str, one snippet name per line.
+        """
+        names = []
+        for relation_name, field_name in FACET_RELATIONS:
+            for addition in getattr(self, relation_name).all():
+                names.append(getattr(addition, field_name).name)
+        return '\n'.join(names)
 
-    search_fields = AbstractBasePage.search_fields + [
-        index.SearchField('get_related_lifecycle_phases'),
-        index.SearchField('get_related_divisions'),
-        index.SearchField('get_related_funder_policies'),
-        index.SearchField('get_related_categories'),
-    ]
+    def save(self, *args, **kwargs):
+        # Saves of a few fields, e.g. when saving a revision, leave the
+        # relations alone.
+        if kwargs.get('update_fields') is None:
+            self.facet_text = self.get_facet_text()
+        return super().save(*args, **kwargs)
 
     def get_context(self, request):
         """
@@ -264,47 +266,245 @@ class ServicePage(AbstractBasePage):
                 clean_url = clean_url[:-1]
 
         context['clean_url'] = clean_url
+        context.update(self.get_facet_context(request))
 
         return context
 
+    def get_facet_context(self, request):
+        """
+        Load everything the detail template lists about the service: its
+        phases, categories, divisions and funder policies, and the URL of
+        the listing page they link back to.
+
+        Published pages fetch the four relations with their snippets in
+        one prefetch pass. Previews use the unsaved relations held in
+        memory instead.
+
+        Args:
+            request (obj): request object.
+
+        Returns:
+            A dictionary of context variables.
+        """
+        if not getattr(request, 'is_preview', False):
+            prefetch_related_objects([self], *get_service_card_prefetches())
+
+        parent = self.get_parent()
+
+        return {
+            'listing_url': parent.get_url(request) if parent else '',
+            'phases': [
+                addition.phase
+                for addition in self.research_lifecycle_phase_additions.all()
+            ],
+            'categories': [
+                addition.category for addition in self.service_category_additions.all()
+            ],
+            'divisions': [addition.division for addition in self.division_additions.all()],
+            'funder_policies': [
+                addition.funder_policy
+                for addition in self.funder_policy_additions.all()
+            ],
+        }
+
+
+# Text searches of the services listing show at most this many services.
+SERVICES_SEARCH_LIMIT = 500
+
+# Relation name and snippet field of every kind of facet, in the order
+# their names appear in ServicePage.facet_text.
+FACET_RELATIONS = [
+    ('research_lifecycle_phase_additions', 'phase'),
+    ('service_category_additions', 'category'),
+    ('division_additions', 'division'),
+    ('funder_policy_additions', 'funder_policy'),
+]
+
+
+def update_facet_text(page_ids):
+    """
+    Recompute facet_text for many services at once, e.g. after a
+    snippet they use is renamed. Uses one query per kind of facet and
+    a bulk update, without sending save signals.
+
+    Args:
+        page_ids (iterable): ServicePage ids.
+
+    Returns:
+        A list of the updated ServicePage objects.
+    """
+    names = defaultdict(list)
+    for relation_name, field_name in FACET_RELATIONS:
+        through = ServicePage._meta.get_field(relation_name).related_model
+        for page_id, name in (
+            through.objects.filter(page_id__in=page_ids)
+            .order_by('page_id', 'sort_order')
+            .values_list('page_id', f'{field_name}__name')
+        ):
+            names[page_id].append(name)
+
+    services = list(ServicePage.objects.filter(id__in=page_ids).only('id'))
+    for service in services:
+        service.facet_text = '\n'.join(names[service.pk])
+    ServicePage.objects.bulk_update(services, ['facet_text'])
+    return services
+
+
+def get_service_card_prefetches():
+    """
+    Prefetches for the additions shown on service cards, each with its
+    snippet, so that listing cards cost a fixed number of queries.
+    """
+    return [
+        Prefetch(
+            'research_lifecycle_phase_additions',
+            queryset=ResearchLifecyclePhaseAddition.objects.select_related('phase'),
+        ),
+        Prefetch(
+            'service_category_additions',
+            queryset=ServiceCategoryAddition.objects.select_related('category'),
+        ),
+        Prefetch(
+            'division_additions',
+            queryset=ServicePageDivisionAddition.objects.select_related('division'),
+        ),
+        Prefetch(
+            'funder_policy_additions',
+            queryset=ServicePageFunderPolicyAddition.objects.select_related(
+                'funder_policy'
+            ),
+        ),
+    ]
+
+
+def prepare_service_cards(services, request=None, parent=None):
+    """
+    Load services for services-listing.html.
+
+    StreamFields are deferred, as cards only show titles and badges.
+    The additions are prefetched and every service gets a listing_url
+    attribute, the URL of its parent page, so that the template never
+    has to look up parents card by card.
+
+    Args:
+        services (obj): ServicePage queryset.
+        request (obj or None): request object, used for URL generation.
+        parent (obj or None): parent page of the services, if known.
+
+    Returns:
+        A list of ServicePage objects.
+    """
+    services = list(
+        services.defer_streamfields().prefetch_related(*get_service_card_prefetches())
+    )
+
+    steplen = Page.steplen
+    listing_urls = {}
+    if parent is not None:
+        listing_urls[parent.path] = parent.get_url(request)
+    parent_paths = {service.path[:-steplen] for service in services} - set(
+        listing_urls
+    )
+    if parent_paths:
+        for page in Page.objects.filter(path__in=parent_paths).only(
+            'id', 'path', 'url_path'
+        ):
+            listing_urls[page.path] = page.get_url(request)
+
+    for service in services:
+        service.listing_url = listing_urls.get(service.path[:-steplen])
+
+    return services
+
 
 class ServicesListingPage(RoutablePageMixin, AbstractBasePage):
     subpage_types = ['services.ServicePage']
 
-    def filter_services(self, request, filter_param, slug=None):
+    # Facets of the services facet index that can be filtered on.
+    filter_facets = ['phase', 'category', 'division', 'funder']
+
+    def search_services(self, filters=None, query=None, request=None):
+        """
+        Find the services below this page that match a set of facet
+        filters and an optional text query, in a single pass over the
+        services facet index.
+
+        Args:
+            filters (dict or None): facet names mapped to lists of slugs.
+            query (str or None): text to search for.
+            request (obj or None): request object, used for URL generation.
+
+        Returns:
+            A tuple of the list of matching services, ordered by relevance
+            and limited to the SERVICES_SEARCH_LIMIT best matches when
+            there is a text query, and the facet value counts.
+        """
+        # Needs to stay here, the facet index imports this module
+        from services.facets import get_service_index
+
+        index = get_service_index()
+
+        ranked_ids = None
+        if query:
+            query_filters, query = parse_query_string(query, operator='or')
+            ranked_ids = [
+                service_id
+                for service_id, cursor in search_ranked(
+                    ServicePage.objects.live().child_of(self),
+                    query,
+                    limit=SERVICES_SEARCH_LIMIT,
+                )
+            ]
+
+        restrict = None if ranked_ids is None else index.bits_for_ids(ranked_ids)
+        bits, counts = index.search(self, filters, restrict)
+
+        service_ids = index.get_ids(bits, order=ranked_ids)
+        services_by_id = {
+            service.pk: service
+            for service in prepare_service_cards(
+                ServicePage.objects.filter(id__in=service_ids), request, parent=self
+            )
+        }
+        services = [
+            services_by_id[service_id]
+            for service_id in service_ids
+            if service_id in services_by_id
+        ]
+
+        return services, counts
+
+    def filter_services(self, request, facet, slug=None):
         """
-        Helper function to filter services based on the provided filter parameter and slug.
+        Helper function to filter services based on the provided facet and slug.
 
         Args:
             request (obj): request object.
-            filter_param (str): string representing a filter parameter.
+            facet (str): name of a facet in the services facet index,
+                e.g. 'phase' or 'category'.
             slug (str or None): slug for a snippet.
 
         Returns:
-            A context override for the sercies variable.
+            The rendered listing page.
 
         """
-        phase_map = {
-            phase.slug: phase.name for phase in ResearchLifecyclePhase.objects.all()
-        }
-        division_map = {
-            division.slug: division.name for division in Division.objects.all()
-        }
+        filters = {}
+        if slug:
+            filters[facet] = [slug.lower()]
 
-        services = self.get_children().live().type(ServicePage).specific()
+        return self.render(request, filters=filters)
 
-        if slug:
-            slug = slug.lower()
-            services = services.filter(**{filter_param: slug}).distinct()
-
-        return self.render(
-            request,
-            context_overrides={
-                'services': services,
-                'service_filter_name': phase_map.get(slug, False),
-                'division_filter_name': division_map.get(slug, False),
-            },
-        )
+    @path('filter/')
+    def combined_filter(self, request):
+        """
+        Filter on several facets at once, e.g.
+        filter/?phase=analyze&division=library&q=data
+        """
+        filters = {
+            facet: [slug.lower() for slug in request.GET.getlist(facet) if slug]
+            for facet in self.filter_facets
+        }
+        return self.render(request, filters=filters)
 
     @path('category/<str:slug>/')
     @path('category/')
@@ -312,8 +512,7 @@ class ServicesListingPage(RoutablePageMixin, AbstractBasePage):
         """
         Category view.
         """
-        filter_param = 'servicepage__service_category_additions__category__slug'
-        return self.filter_services(request, filter_param, slug)
+        return self.filter_services(request, 'category', slug)
 
     @path('division/<str:slug>/')
     @path('division/')
@@ -321,8 +520,7 @@ class ServicesListingPage(RoutablePageMixin, AbstractBasePage):
         """
         Division view.
         """
-        filter_param = 'servicepage__division_additions__division__slug'
-        return self.filter_services(request, filter_param, slug)
+        return self.filter_services(request, 'division', slug)
 
     @path('funder/<str:slug>/')
     @path('funder/')
@@ -330,8 +528,7 @@ class ServicesListingPage(RoutablePageMixin, AbstractBasePage):
         """
         Funder policy view.
         """
-        filter_param = 'servicepage__funder_policy_additions__funder_policy__slug'
-        return self.filter_services(request, filter_param, slug)
+        return self.filter_services(request, 'funder', slug)
 
     @path('phase/<str:slug>/')
     @path('phase/')
@@ -339,31 +536,49 @@ class ServicesListingPage(RoutablePageMixin, AbstractBasePage):
         """
         Research lifecycle phase view.
         """
-        filter_param = 'servicepage__research_lifecycle_phase_additions__phase__slug'
-        return self.filter_services(request, filter_param, slug)
+        return self.filter_services(request, 'phase', slug)
 
     content_panels = AbstractBasePage.content_panels + [
         InlinePanel('phase_menu', label="Lifecycle phase dropdown menu"),
     ]
 
-    def get_context(self, request):
+    def get_context(self, request, filters=None, *args, **kwargs):
         """
         Override the page object's get context method.
         """
-        context = super(ServicesListingPage, self).get_context(request)
+        # Needs to stay here, the facet index imports this module
+        from services.facets import get_service_index
 
-        services = self.get_children().live().type(ServicePage).specific()
-        phases = ResearchLifecyclePhase.objects.all()
-        divisions = Division.objects.all()
+        context = super(ServicesListingPage, self).get_context(request, *args, **kwargs)
 
-        query = request.GET.get('q')
+        filters = {facet: slugs for facet, slugs in (filters or {}).items() if slugs}
+        services, facet_counts = self.search_services(
+            filters, request.GET.get('q'), request
+        )
 
-        if query:
-            query_filters, query = parse_query_string(query, operator='or')
-            services = services.search(query)
+        index = get_service_index()
+        phase_names = [index.get_name('phase', slug) for slug in filters.get('phase', [])]
+        division_names = [
+            index.get_name('division', slug) for slug in filters.get('division', [])
+        ]
+
+        filter_query = QueryDict(mutable=True)
+        for facet, slugs in filters.items():
+            filter_query.setlist(facet, slugs)
+        if request.GET.get('q'):
+            filter_query['q'] = request.GET['q']
 
         context['services'] = services
-        context['phases'] = [order.phase for order in self.phase_menu.all()]
-        context['divisions'] = divisions
+        context['facet_counts'] = facet_counts
+        context['selected_filters'] = filters
+        context['filter_query'] = filter_query
+        context['service_filter_name'] = ', '.join(filter(None, phase_names)) or False
+        context['division_filter_name'] = ', '.join(filter(None, division_names)) or False
+        context['phases'] = [
+            order.phase for order in self.phase_menu.all().select_related('phase')
+        ]
+        context['divisions'] = sorted(
+            index.snippets['division'].values(), key=lambda division: division.name
+        )
 
         return context
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wagtail.signals import page_published, page_unpublished, post_page_move
+
+from search.indexing import enqueue
+from services.facets import (
+    FACETS,
+    service_changed,
+    services_changed,
+    snippet_changed,
+)
+from services.models import ServicePage, update_facet_text
+
+SNIPPET_FACETS = {snippet_model: facet for facet, (_, _, snippet_model) in FACETS.items()}
+
+
+@receiver(post_save, sender=ServicePage)
+def service_page_saved(sender, instance, **kwargs):
+    # Saving a draft revision only touches a few fields on the live page.
+    if not kwargs.get('update_fields'):
+        service_changed(instance.pk)
+
+
+@receiver(page_published, sender=ServicePage)
+@receiver(page_unpublished, sender=ServicePage)
+@receiver(post_delete, sender=ServicePage)
+def service_page_changed(sender, instance, **kwargs):
+    service_changed(instance.pk)
+
+
+@receiver(post_page_move)
+def page_moved(sender, **kwargs):
+    # Moving any ancestor changes the paths of the services below it.
+    services_changed()
+
+
+@receiver(post_save)
+def snippet_saved(sender, instance, **kwargs):
+    if sender in SNIPPET_FACETS:
+        facet = SNIPPET_FACETS[sender]
+        snippet_changed(facet, instance)
+
+        # The snippet may have been renamed, so bring the facet text and
+        # search documents of the services that use it up to date.
+        through, field_name, _ = FACETS[facet]
+        page_ids = list(
+            through.objects.filter(**{field_name: instance}).values_list(
+                'page_id', flat=True
+            )
+        )
+        update_facet_text(page_ids)
+        enqueue(ServicePage, page_ids)
+
+
+@receiver(post_delete)
+def snippet_deleted(sender, instance, **kwargs):
+    if sender in SNIPPET_FACETS:
+        services_changed()
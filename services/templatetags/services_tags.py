@@ -0,0 +1,9 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def facet_count(facet_counts, facet, slug):
+    """Number of services that choosing a facet value would list."""
+    return facet_counts.get(facet, {}).get(slug, 0)
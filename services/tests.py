@@ -1,3 +1,349 @@
+from unittest.mock import patch
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from wagtail.models import Page
+
+from base.cache import increment_generation
+from base.settings_cache import SETTINGS_GENERATION, get_generic_settings
+from search.indexing import process_queue
+from services.facets import SERVICES_GENERATION, get_service_index
+from services.models import (
+    Division,
+    PhaseMenu,
+    ResearchLifecyclePhase,
+    ResearchLifecyclePhaseAddition,
+    ServiceCategory,
+    ServiceCategoryAddition,
+    ServicePage,
+    ServicePageDivisionAddition,
+    ServicesListingPage,
+)
+
+
+class ServicesTestCase(TestCase):
+    def setUp(self):
+        # Start every test from a freshly built facet index.
+        increment_generation(SERVICES_GENERATION)
+
+        home = Page.objects.get(depth=2)
+        self.listing = ServicesListingPage(title='Services', slug='services')
+        home.add_child(instance=self.listing)
+
+        self.analyze = ResearchLifecyclePhase.objects.create(name='Analyze')
+        self.share = ResearchLifecyclePhase.objects.create(name='Share')
+        self.storage = ServiceCategory.objects.create(name='Storage')
+        self.library = Division.objects.create(name='Library')
+
+    def add_service(self, title, phases=(), categories=(), divisions=()):
+        service = ServicePage(
+            title=title,
+            slug=title.lower().replace(' ', '-'),
+            research_lifecycle_phase_additions=[
+                ResearchLifecyclePhaseAddition(phase=phase) for phase in phases
+            ],
+            service_category_additions=[
+                ServiceCategoryAddition(category=category) for category in categories
+            ],
+            division_additions=[
+                ServicePageDivisionAddition(division=division)
+                for division in divisions
+            ],
+        )
+        self.listing.add_child(instance=service)
+        return service
+
+
+class ServiceIndexTestCase(ServicesTestCase):
+    def test_filter_by_facets(self):
+        notebook = self.add_service('Notebook', phases=[self.analyze])
+        cluster = self.add_service(
+            'Cluster', phases=[self.analyze], categories=[self.storage]
+        )
+        repository = self.add_service(
+            'Repository', phases=[self.share], divisions=[self.library]
+        )
+
+        index = get_service_index()
+
+        self.assertEqual(
+            index.filter(self.listing), [notebook.pk, cluster.pk, repository.pk]
+        )
+        self.assertEqual(index.filter(self.listing, phase='analyze'), [notebook.pk, cluster.pk])
+        self.assertEqual(
+            index.filter(self.listing, phase='analyze', category='storage'),
+            [cluster.pk],
+        )
+        self.assertEqual(index.filter(self.listing, division='library'), [repository.pk])
+        self.assertEqual(index.filter(self.listing, phase='unknown'), [])
+        self.assertEqual(index.get_name('phase', 'share'), 'Share')
+
+    def test_index_is_updated_on_publish(self):
+        service = self.add_service('Notebook', phases=[self.analyze])
+        get_service_index()
+
+        service.research_lifecycle_phase_additions = [
+            ResearchLifecyclePhaseAddition(phase=self.share)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save_revision().publish()
+
+        index = get_service_index()
+        self.assertEqual(index.filter(self.listing, phase='analyze'), [])
+        self.assertEqual(index.filter(self.listing, phase='share'), [service.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            service.unpublish()
+
+        self.assertEqual(get_service_index().filter(self.listing), [])
+
+    def test_index_is_updated_on_snippet_rename(self):
+        self.add_service('Notebook', phases=[self.analyze])
+        get_service_index()
+
+        self.analyze.name = 'Analyze and Collaborate'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.analyze.save()
+
+        index = get_service_index()
+        self.assertEqual(
+            index.get_name('phase', 'analyze-and-collaborate'), 'Analyze and Collaborate'
+        )
+        self.assertEqual(index.filter(self.listing, phase='analyze'), [])
+
+    def test_phase_view(self):
+        self.add_service('Notebook', phases=[self.analyze])
+        self.add_service('Repository', phases=[self.share])
+
+        response = self.client.get('/services/phase/analyze/')
+
+        self.assertEqual(response.context['service_filter_name'], 'Analyze')
+        self.assertEqual(
+            [service.title for service in response.context['services']], ['Notebook']
+        )
+
+    def test_search_combines_facets_and_counts_values(self):
+        notebook = self.add_service('Notebook', phases=[self.analyze])
+        cluster = self.add_service(
+            'Cluster', phases=[self.analyze, self.share], divisions=[self.library]
+        )
+        self.add_service('Repository', phases=[self.share])
+
+        index = get_service_index()
+        bits, counts = index.search(
+            self.listing, {'phase': ['analyze', 'share'], 'division': ['library']}
+        )
+
+        self.assertEqual(index.get_ids(bits), [cluster.pk])
+        # Phase counts only take the division filter into account.
+        self.assertEqual(counts['phase'], {'analyze': 1, 'share': 1})
+        self.assertEqual(counts['division'], {'library': 1})
+
+        bits, counts = index.search(self.listing, {'phase': ['analyze']})
+        self.assertEqual(index.get_ids(bits), [notebook.pk, cluster.pk])
+        self.assertEqual(counts['phase'], {'analyze': 2, 'share': 2})
+
+    def test_combined_filter_view(self):
+        self.add_service('Notebook', phases=[self.analyze])
+        self.add_service('Cluster', phases=[self.analyze], divisions=[self.library])
+        self.add_service('Repository', phases=[self.share], divisions=[self.library])
+        self.listing.phase_menu = [
+            PhaseMenu(phase=self.analyze),
+            PhaseMenu(phase=self.share),
+        ]
+        self.listing.save()
+
+        response = self.client.get(
+            '/services/filter/', {'phase': ['analyze'], 'division': ['library']}
+        )
+
+        self.assertEqual(
+            [service.title for service in response.context['services']], ['Cluster']
+        )
+        self.assertEqual(response.context['service_filter_name'], 'Analyze')
+        self.assertEqual(response.context['division_filter_name'], 'Library')
+        self.assertContains(response, 'Share (1)')
+        self.assertContains(
+            response, 'href="/services/filter/?phase=share&amp;division=library"'
+        )
+
+
+class SuggestTestCase(ServicesTestCase):
+    def test_suggestions_match_word_prefixes(self):
+        self.add_service('Data Storage', phases=[self.analyze])
+        self.add_service('Cloud Storage', categories=[self.storage])
+
+        index = get_service_index()
+
+        self.assertEqual(
+            [suggestion.label for suggestion in index.suggest('STOR')],
+            ['Storage', 'Cloud Storage', 'Data Storage'],
+        )
+        self.assertEqual(
+            [suggestion.label for suggestion in index.suggest('data s')],
+            ['Data Storage'],
+        )
+        # Snippets no live service uses are left out.
+        self.assertEqual(index.suggest('share'), [])
+        self.assertEqual(index.suggest(' '), [])
+
+    def test_suggestions_follow_publishing(self):
+        service = self.add_service('Notebook')
+        self.assertEqual(len(get_service_index().suggest('note')), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            service.unpublish()
+
+        self.assertEqual(get_service_index().suggest('note'), [])
+
+    def test_suggest_view(self):
+        self.add_service('Notebook', phases=[self.analyze])
+        response = self.client.get('/search/services/', {'q': 'note'})
+        self.assertEqual(
+            response.json(),
+            {'suggestions': [{'label': 'Notebook', 'url': '/services/notebook/'}]},
+        )
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/search/services/', {'q': 'a'})
+
+        self.assertEqual(
+            response.json(),
+            {'suggestions': [{'label': 'Analyze', 'facet': 'phase', 'slug': 'analyze'}]},
+        )
+
+
+class ServicesListingQueriesTestCase(ServicesTestCase):
+    def setUp(self):
+        super().setUp()
+        # Create the generic settings rows up front, as saving them
+        # invalidates the settings cache. The cache outlives each test's
+        # transaction, so force a fresh load first.
+        increment_generation(SETTINGS_GENERATION)
+        get_generic_settings()
+
+    def get_listing_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/services/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_listing_query_count_does_not_grow_with_services(self):
+        self.add_service('Notebook', categories=[self.storage])
+        self.get_listing_queries()
+        queries = self.get_listing_queries()
+
+        for i in range(5):
+            self.add_service(
+                f'Cluster {i}',
+                phases=[self.analyze],
+                categories=[self.storage],
+                divisions=[self.library],
+            )
+        self.get_listing_queries()
+
+        self.assertEqual(self.get_listing_queries(), queries)
+
+    def test_category_badges_link_to_the_listing(self):
+        self.add_service('Notebook', categories=[self.storage])
+
+        response = self.client.get('/services/')
+
+        self.assertContains(response, 'href="/services/category/storage"')
+
+
+class ServicePageTestCase(ServicesTestCase):
+    def setUp(self):
+        super().setUp()
+        increment_generation(SETTINGS_GENERATION)
+        get_generic_settings()
+
+    def get_service_queries(self, service):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(service.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_detail_lists_facets(self):
+        service = self.add_service(
+            'Notebook', phases=[self.analyze], divisions=[self.library]
+        )
+
+        response = self.client.get(service.url)
+
+        self.assertEqual(response.context['phases'], [self.analyze])
+        self.assertEqual(response.context['divisions'], [self.library])
+        self.assertContains(response, 'href="/services/phase/analyze"')
+
+    def test_detail_query_count_does_not_grow_with_facets(self):
+        few = self.add_service('Notebook', phases=[self.analyze])
+        many = self.add_service(
+            'Cluster',
+            phases=[self.analyze, self.share],
+            categories=[self.storage],
+            divisions=[self.library],
+        )
+        self.get_service_queries(few)
+
+        self.assertEqual(
+            self.get_service_queries(many), self.get_service_queries(few)
+        )
+
+
+class FacetTextTestCase(ServicesTestCase):
+    def test_facet_text_is_kept_up_to_date(self):
+        service = self.add_service(
+            'Notebook', phases=[self.analyze], divisions=[self.library]
+        )
+        self.assertEqual(service.facet_text, 'Analyze\nLibrary')
+
+        service.service_category_additions = [
+            ServiceCategoryAddition(category=self.storage)
+        ]
+        service.save_revision().publish()
+        service.refresh_from_db()
+        self.assertEqual(service.facet_text, 'Analyze\nStorage\nLibrary')
+
+        self.library.name = 'Library IT'
+        self.library.save()
+        service.refresh_from_db()
+        self.assertEqual(service.facet_text, 'Analyze\nStorage\nLibrary IT')
+
+    def test_services_are_found_by_facet_name(self):
+        service = self.add_service('Notebook', categories=[self.storage])
+        process_queue()
+
+        results = ServicePage.objects.live().search('storage')
+
+        self.assertEqual([result.pk for result in results], [service.pk])
+
+    def test_text_search_is_capped_and_loads_only_ids(self):
+        self.add_service('Notebook', categories=[self.storage])
+        self.add_service('Cluster', categories=[self.storage])
+        process_queue()
+
+        with patch('services.models.SERVICES_SEARCH_LIMIT', 1):
+            with CaptureQueriesContext(connection) as queries:
+                services, counts = self.listing.search_services(query='storage')
+
+        self.assertEqual(len(services), 1)
+        # Only the services that are shown are loaded as full rows.
+        service_loads = [
+            query['sql']
+            for query in queries.captured_queries
+            if '"wagtailcore_page"."latest_revision_id"' in query['sql']
+        ]
+        self.assertEqual(len(service_loads), 1)
+
+    def test_renaming_a_snippet_reindexes_its_services(self):
+        service = self.add_service('Notebook', categories=[self.storage])
+        self.add_service('Cluster', categories=[])
+        process_queue()
+
+        self.storage.name = 'Archival Storage'
+        self.storage.save()
+        process_queue()
 
-# Create your tests here.
+        results = ServicePage.objects.live().search('archival')
+        self.assertEqual([result.pk for result in results], [service.pk])
@@ -1,3 +1,37 @@
-from django.shortcuts import render
+from django.http import JsonResponse
 
-# Create your views here.
+from services.facets import get_service_index
+from services.models import ServicePage
+
+
+def suggest(request):
+    """
+    Typeahead suggestions for the services search box, answered from
+    the in-memory facet index.
+
+    Args:
+        request (obj): request object, with the text typed so far in q.
+
+    Returns:
+        A JSON response with a list of suggestions. Services come with
+        their url, and facet values with their facet and slug.
+    """
+    suggestions = []
+    index = get_service_index()
+    for suggestion in index.suggest(request.GET.get('q', '')):
+        if suggestion.facet is None:
+            record = index.records[index.positions[suggestion.id]]
+            # The URL only depends on url_path and the cached site root paths.
+            url = ServicePage(id=record.id, url_path=record.url_path).get_url(request)
+            suggestions.append({'label': suggestion.label, 'url': url})
+        else:
+            snippet = index.snippets[suggestion.facet][suggestion.id]
+            suggestions.append(
+                {
+                    'label': suggestion.label,
+                    'facet': suggestion.facet,
+                    'slug': snippet.slug,
+                }
+            )
+
+    return JsonResponse({'suggestions': suggestions})